@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    Benchmark context compression on synthetic histories shaped like real
+    chats: long answers ending in the medical disclaimer, and users who
+    repeat a question. Reports estimated tokens before and after, the time
+    to compress a history cold and with memoized messages, and the time to
+    first token of a model whose prefill cost grows with the prompt.
+
+    Run from the repository root:
+        PYTHONPATH=src python benchmarks/context_compression.py --turns 20 --prefill-ms 30
+"""
+
+from memory.compression import _shingles, compress_history, compress_message
+from models.supabase import MessageBatch
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+import argparse
+import random
+import time
+
+DISCLAIMER = (
+    "**Disclaimer:** I'm not a doctor. This information is for educational purposes only. "
+    "Please consult a licensed healthcare professional for personalized advice."
+)
+SENTENCES = [
+    "Rest and plenty of fluids help the body recover.",
+    "Paracetamol or ibuprofen can bring the temperature down and ease aches.",
+    "Keep track of the temperature at least twice a day.",
+    "See a doctor if the fever rises above 39.4°C or comes with a stiff neck, a rash or confusion.",
+    "Children under three months with any fever should be seen the same day.",
+    "Light clothing and a cool room are more comfortable than heavy blankets.",
+    "Honey and warm drinks soothe a sore throat.",
+    "A cough that brings up green or bloody mucus should be checked.",
+    "Wash your hands often so the infection does not spread at home.",
+    "Most viral infections clear up within a week without antibiotics.",
+    "Shortness of breath or chest pain needs urgent care.",
+    "Sleep is when the immune system does much of its work.",
+]
+
+
+def make_rows(turns: int) -> List[Dict[str, Any]]:
+    """A history of `turns` question/answer pairs; every third question repeats an earlier one."""
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    rng = random.Random(0)
+    rows: List[Dict[str, Any]] = []
+    for turn in range(turns):
+        question = (
+            "My fever has not gone away, what should I do?" if turn % 3 == 2
+            else f"I have had a fever for {turn + 1} days, is that normal?"
+        )
+        answer = " ".join(
+            [f"A fever that lasts {turn + 1} days is usually caused by a viral infection."]
+            + rng.sample(SENTENCES, 7)
+            + [DISCLAIMER]
+        )
+        for sender, message in (("user", question), ("assistant", answer)):
+            rows.append({
+                "user_id": "benchmark",
+                "chat_id": "benchmark",
+                "sender": sender,
+                "message": message,
+                "meta": {},
+                "timestamp": (start + timedelta(seconds=len(rows))).isoformat(),
+            })
+    return rows
+
+
+def time_to_first_token(tokens: int, prefill_ms: float) -> float:
+    """Modeled time to first token: prefill cost per 1k prompt tokens plus a fixed 150 ms."""
+    return 150 + prefill_ms * tokens / 1000
+
+
+def main(args) -> None:
+    batch = MessageBatch.from_rows(make_rows(args.turns))
+
+    compress_message.cache_clear()
+    _shingles.cache_clear()
+    start = time.perf_counter()
+    context = compress_history(batch)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        compress_history(batch)
+    warm_ms = (time.perf_counter() - start) * 1000 / args.repeat
+
+    # The system prompt and question are sent either way
+    fixed = args.prompt_tokens
+    raw_ttft = time_to_first_token(fixed + context.tokens, args.prefill_ms)
+    compressed_ttft = time_to_first_token(fixed + context.compressed_tokens, args.prefill_ms)
+
+    print(f"{len(batch)} messages ({args.turns} turns)")
+    print(
+        f"tokens       raw {context.tokens:6d}  compressed {context.compressed_tokens:6d}  "
+        f"saved {context.saved_tokens} ({context.saved_tokens / context.tokens:.0%}), "
+        f"{context.dropped_turns} duplicate turns dropped"
+    )
+    print(f"compression  cold {cold_ms:6.2f} ms  memoized {warm_ms:6.3f} ms")
+    print(
+        f"modeled TTFT raw {raw_ttft:6.0f} ms  compressed {compressed_ttft:6.0f} ms  "
+        f"({raw_ttft - compressed_ttft:.0f} ms faster at {args.prefill_ms} ms per 1k prompt tokens)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--prefill-ms", type=float, default=30.0, help="model prefill time per 1k prompt tokens")
+    parser.add_argument("--prompt-tokens", type=int, default=600, help="system prompt and question, sent either way")
+    main(parser.parse_args())
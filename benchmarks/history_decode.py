@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    Benchmark decoding a conversation history result into a prompt
+    transcript. The previous path validated a `MessageRecord` per row,
+    converting the sender and parsing the timestamp eagerly; the batch
+    path decodes rows column by column into a `MessageBatch` and only
+    builds records on demand.
+
+    Run from the repository root:
+        PYTHONPATH=src python benchmarks/history_decode.py --rows 10000
+"""
+
+from models.supabase import MessageBatch, MessageRecord
+from datetime import datetime, timedelta, timezone
+from utils.metrics import percentile
+from utils.types import Sender
+from typing import Any, Callable, Dict, List
+import tracemalloc
+import argparse
+import uuid
+import time
+
+
+def make_rows(count: int) -> List[Dict[str, Any]]:
+    """Rows shaped like the Supabase `messages` table."""
+    user_id, chat_id = str(uuid.uuid4()), str(uuid.uuid4())
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        sender = Sender.USER if i % 2 == 0 else Sender.SYSTEM
+        rows.append({
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "sender": sender.value,
+            "message": f"Message {i}: how long should a fever last before I see a doctor? " * 2,
+            "meta": {"chat_id": chat_id, "timestamp": (start + timedelta(seconds=i)).isoformat()},
+            "timestamp": (start + timedelta(seconds=i)).isoformat().replace("+00:00", "Z"),
+        })
+    return rows
+
+
+def record_path(rows: List[Dict[str, Any]]) -> str:
+    """The previous decoding: one validated model per row, then the transcript."""
+    messages = [
+        MessageRecord(
+            user_id=str(record["user_id"]),
+            chat_id=str(record.get("chat_id", "")),
+            sender=Sender(record["sender"]),
+            message=record["message"],
+            meta=record.get("meta", {}),
+            timestamp=datetime.fromisoformat(record["timestamp"].replace('Z', '+00:00'))
+        )
+        for record in rows
+    ]
+    return "\n".join([f"{record.sender.value}: {record.message}" for record in messages])
+
+
+def batch_path(rows: List[Dict[str, Any]]) -> str:
+    """Columnar decoding straight to the transcript."""
+    return MessageBatch.from_rows(rows).transcript()
+
+
+def batch_records_path(rows: List[Dict[str, Any]]) -> str:
+    """Columnar decoding, then every full record built on demand."""
+    batch = MessageBatch.from_rows(rows)
+    records = batch.records()
+    return "\n".join([f"{record.sender.value}: {record.message}" for record in records])
+
+
+def measure(fn: Callable[[List[Dict[str, Any]]], str], rows: List[Dict[str, Any]], repeats: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    result = fn(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"p50": percentile(timings, 50), "p95": percentile(timings, 95), "peak_mb": peak / 1024 / 1024}
+
+
+def main(args) -> None:
+    rows = make_rows(args.rows)
+    assert record_path(rows) == batch_path(rows) == batch_records_path(rows)
+
+    paths = {
+        "MessageRecord per row": record_path,
+        "MessageBatch": batch_path,
+        "MessageBatch + records": batch_records_path,
+    }
+    print(f"{args.rows} rows, {args.repeats} repeats")
+    baseline = None
+    for name, fn in paths.items():
+        result = measure(fn, rows, args.repeats)
+        baseline = baseline or result["p50"]
+        print(
+            f"{name:<24} p50 {result['p50']:8.2f} ms  p95 {result['p95']:8.2f} ms  "
+            f"peak {result['peak_mb']:6.1f} MB  ({baseline / result['p50']:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    Check the local intent classifier against labelled messages and time
+    it. Medical messages must never be routed to the canned or small-talk
+    paths, which have no history and give no medical information; the
+    script exits non-zero if one is. The medical cases include greetings
+    followed by a symptom that were once routed to small talk. Replies
+    such as "sure" to a question from the assistant must not be canned.
+
+    Run from the repository root:
+        PYTHONPATH=src python benchmarks/intent_routing.py
+"""
+
+from llms.router import asks_question, classify_intent, needs_last_reply
+from utils.types import Route
+import argparse
+import sys
+import time
+
+SMALL_TALK = [
+    "hi", "Hello there!", "thanks so much", "ok", "bye", "good morning",
+    "hi there how are you doing", "thanks so much, you are awesome",
+    "good morning meditreat, how are you", "hello! who are you?", "haha nice",
+    "hey, thank you so much for your help",
+]
+MEDICAL = [
+    # Greeting followed by a symptom or emergency
+    "hey I overdosed", "hey my son fainted", "hi im dizzy", "hello I have covid",
+    "hello, I feel faint", "hi, chest pain", "hey thanks, my rash is spreading",
+    "good morning, I took too many pills",
+    "What is a safe dose of paracetamol for a child?",
+    "My fever has lasted three days, should I see a doctor?",
+    "latest news on the measles outbreak",
+]
+DISCLAIMER = " **Disclaimer:** I'm not a doctor. This information is for educational purposes only."
+# (message, the assistant's last answer, whether a canned reply is fine)
+FOLLOW_UPS = [
+    ("sure", "Ibuprofen can help. Would you like dosage details?" + DISCLAIMER, False),
+    ("ok", "Is the fever above 39°C?", False),
+    ("later", "Should I explain the warning signs?" + DISCLAIMER, False),
+    ("ok", "Rest and drink plenty of fluids." + DISCLAIMER, True),
+    ("thanks", "Would you like dosage details?", True),
+]
+
+
+def main(args) -> int:
+    failures = 0
+    for message in SMALL_TALK:
+        route = classify_intent(message).route
+        if route not in (Route.CANNED, Route.SMALL_TALK):
+            print(f"missed small talk ({route.value}): {message!r}")
+    for message in MEDICAL:
+        route = classify_intent(message).route
+        if route in (Route.CANNED, Route.SMALL_TALK):
+            failures += 1
+            print(f"MEDICAL MESSAGE ROUTED TO {route.value}: {message!r}")
+    for message, last_reply, canned_ok in FOLLOW_UPS:
+        intent = classify_intent(message)
+        canned = intent.route is Route.CANNED and not (needs_last_reply(intent) and asks_question(last_reply))
+        if canned and not canned_ok:
+            failures += 1
+            print(f"ANSWER TO A QUESTION GOT A CANNED REPLY: {message!r} after {last_reply[:40]!r}")
+
+    messages = SMALL_TALK + MEDICAL
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for message in messages:
+            classify_intent(message)
+    per_message_us = (time.perf_counter() - start) * 1e6 / (args.repeat * len(messages))
+    print(f"{len(messages)} messages, {failures} misroutes, {per_message_us:.1f} µs per classification")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000)
+    sys.exit(main(parser.parse_args()))
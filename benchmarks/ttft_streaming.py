@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    Benchmark time-to-first-token of the agent when streamed per graph
+    update (the previous behaviour) versus per token through
+    `AIChatCore.generate`. Uses an offline fake model that emits one
+    token every `--delay` seconds, so no provider key is needed.
+
+    Run from the repository root:
+        PYTHONPATH=src python benchmarks/ttft_streaming.py --tokens 200 --delay 0.01
+"""
+
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.language_models import BaseChatModel
+from langchain_core.prompts import ChatPromptTemplate
+from langgraph.prebuilt import create_react_agent
+from langchain_core.messages import AIMessage, AIMessageChunk
+from utils.messages import message_text
+from llms.models import AIChatCore
+import argparse
+import asyncio
+import time
+
+
+class SlowFakeChatModel(BaseChatModel):
+    """Offline chat model that streams `tokens` words with a fixed delay."""
+    tokens: int = 200
+    delay: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError("Only the async path is benchmarked.")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = ""
+        async for chunk in self._astream(messages, stop, run_manager, **kwargs):
+            text += chunk.text
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for i in range(self.tokens):
+            await asyncio.sleep(self.delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"token{i} "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+async def ttft_updates(agent) -> tuple[float, float]:
+    """TTFT and total time when streaming agent graph updates."""
+    prompt = ChatPromptTemplate.from_template("{context} {user_query}")
+    chain = prompt | agent
+    start = time.perf_counter()
+    first = None
+    async for chunk in chain.astream({"context": "", "user_query": "hello"}):
+        messages = chunk.get("agent", {}).get("messages", [])
+        if first is None and any(message_text(message) for message in messages):
+            first = time.perf_counter() - start
+    return first or 0.0, time.perf_counter() - start
+
+
+async def ttft_tokens(agent) -> tuple[float, float]:
+    """TTFT and total time when streaming agent tokens."""
+    core = AIChatCore(agent, system_prompt="{context} {user_query}")
+    start = time.perf_counter()
+    first = None
+    async for token in core.generate("hello", ""):
+        if first is None and isinstance(token, str):
+            first = time.perf_counter() - start
+    return first or 0.0, time.perf_counter() - start
+
+
+async def main(tokens: int, delay: float, runs: int) -> None:
+    for name, runner in (("updates", ttft_updates), ("messages", ttft_tokens)):
+        results = []
+        for _ in range(runs):
+            agent = create_react_agent(SlowFakeChatModel(tokens=tokens, delay=delay), tools=[])
+            results.append(await runner(agent))
+        ttft = sum(r[0] for r in results) / runs * 1000
+        total = sum(r[1] for r in results) / runs * 1000
+        print(f"{name:>9}: ttft={ttft:8.1f} ms  total={total:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.01)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.delay, args.runs))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    Benchmark time-to-first-token of a chat turn when its stages run one
+    after another (the previous behaviour) versus through the engine's
+    dependency-aware pipeline. Every stage gets an injected latency:
+    model construction and Supabase client setup block their thread, the
+    history fetch, summary and first token wait on the event loop.
+
+    Run from the repository root:
+        PYTHONPATH=src python benchmarks/turn_pipeline.py --turns 10
+"""
+
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk
+from utils.metrics import metrics, percentile
+from llms.models import AIChatCore
+from models.supabase import MessageBatch
+from models.api import UserInput
+import core.engine as engine_module
+import argparse
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("benchmark")
+
+
+class DelayedFakeChatModel(BaseChatModel):
+    """Offline chat model whose first token arrives after a delay."""
+    first_token: float = 0.05
+
+    @property
+    def _llm_type(self) -> str:
+        return "delayed-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError("Only the async path is benchmarked.")
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token)
+        for word in ("Rest", " and", " fluids", " help."):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+def inject_latencies(args) -> None:
+    """Replace the engine's dependencies with fakes that sleep per stage."""
+    class FakeMemory:
+        def __init__(self, logger):
+            time.sleep(args.client_ms / 1000)
+
+        async def get_conversation_history(self, user_id, chat_id, query="", limit=3):
+            await asyncio.sleep(args.history_ms / 1000)
+            return MessageBatch.from_rows([])
+
+        async def add_message_record(self, message):
+            return message
+
+    def fake_get_llm(llm_name="openai", tools=True):
+        time.sleep(args.llm_ms / 1000)
+        return DelayedFakeChatModel(first_token=args.first_token_ms / 1000)
+
+    async def fake_summarize(self, context):
+        await asyncio.sleep(args.summarize_ms / 1000)
+        return "No context available."
+
+    engine_module.SupabaseMemoryManager = FakeMemory
+    engine_module.get_llm = fake_get_llm
+    AIChatCore.summarize = fake_summarize
+
+
+async def sequential_ttft(user_input: UserInput) -> float:
+    """TTFT with every stage awaited in turn, as the chat handler used to."""
+    start = time.perf_counter()
+    llm = engine_module.get_llm(user_input.llm, tools=False)
+    memory = engine_module.SupabaseMemoryManager(logger)
+    context = await memory.get_conversation_history(user_input.user_id, user_input.chat_id)
+    model = AIChatCore(llm)
+    context_str = context.transcript()
+    await model.summarize(context_str)
+    async for _ in model.generate(user_input.message, context_str):
+        return (time.perf_counter() - start) * 1000
+    return (time.perf_counter() - start) * 1000
+
+
+async def pipeline_ttft(engine: engine_module.ChatTurnEngine, user_input: UserInput) -> float:
+    """TTFT through `ChatTurnEngine.start`."""
+    start = time.perf_counter()
+    turn = await engine.start(user_input, resumable=False)
+    await turn.stream.wait_for_frames(0)
+    ttft = (time.perf_counter() - start) * 1000
+    await engine.finish(turn)
+    return ttft
+
+
+async def main(args) -> None:
+    inject_latencies(args)
+
+    def user_input() -> UserInput:
+        return UserInput(user_id="benchmark", chat_id="benchmark", message="What helps with a sore throat?")
+
+    results = {"sequential": [], "pipeline (cold)": [], "pipeline (warm)": []}
+    warm = engine_module.ChatTurnEngine(logger)
+    for _ in range(args.turns):
+        results["sequential"].append(await sequential_ttft(user_input()))
+        # A fresh engine has to build its model and client on this turn
+        results["pipeline (cold)"].append(await pipeline_ttft(engine_module.ChatTurnEngine(logger), user_input()))
+        results["pipeline (warm)"].append(await pipeline_ttft(warm, user_input()))
+
+    print(
+        f"Injected latencies (ms): llm={args.llm_ms} client={args.client_ms} history={args.history_ms} "
+        f"summarize={args.summarize_ms} first_token={args.first_token_ms}"
+    )
+    baseline = percentile(results["sequential"], 50)
+    for name, values in results.items():
+        p50 = percentile(values, 50)
+        print(
+            f"{name:<18} TTFT p50 {p50:8.1f} ms  p95 {percentile(values, 95):8.1f} ms  "
+            f"({baseline / p50:.2f}x vs sequential)"
+        )
+    for key, summary in metrics.snapshot()["timings"].items():
+        if key.startswith("chat.stage_ms"):
+            print(f"{key:<40} mean {summary['mean']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--llm-ms", type=float, default=80)
+    parser.add_argument("--client-ms", type=float, default=60)
+    parser.add_argument("--history-ms", type=float, default=120)
+    parser.add_argument("--summarize-ms", type=float, default=400)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    asyncio.run(main(parser.parse_args()))
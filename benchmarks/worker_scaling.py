@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    Benchmark server throughput against the number of uvicorn workers.
+    For 1 to N workers it starts `src/serve.py`, waits for /health, warms
+    the workers up and then drives a fixed number of concurrent keep-alive
+    clients at one endpoint for a fixed time. Reports requests per second
+    and latency percentiles for each worker count.
+
+    The load generator runs in its own processes on the same host, so
+    leave it cores of its own (`--client-processes`) or the numbers
+    measure the contention between the two.
+
+    Run from the repository root:
+        PYTHONPATH=src python benchmarks/worker_scaling.py --max-workers 4 --path /metrics
+"""
+
+from utils.offload import cpu_count
+from utils.metrics import percentile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+import multiprocessing
+import subprocess
+import argparse
+import asyncio
+import signal
+import httpx
+import time
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    """Start the API with `workers` uvicorn workers and wait until it answers."""
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "src", "serve.py"), "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server with {workers} workers exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f"Server with {workers} workers did not start within 60 s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def _drive(url: str, clients: int, duration: float) -> Tuple[List[float], int]:
+    latencies: List[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker() -> None:
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(worker() for _ in range(clients)))
+    return latencies, errors
+
+
+def drive(url: str, clients: int, duration: float) -> Tuple[List[float], int]:
+    """Keep `clients` concurrent requests in flight for `duration` seconds."""
+    return asyncio.run(_drive(url, clients, duration))
+
+
+def measure(pool: ProcessPoolExecutor, url: str, args) -> Tuple[List[float], int]:
+    clients = max(1, args.clients // args.client_processes)
+    futures = [pool.submit(drive, url, clients, args.duration) for _ in range(args.client_processes)]
+    latencies: List[float] = []
+    errors = 0
+    for future in futures:
+        part, failed = future.result()
+        latencies.extend(part)
+        errors += failed
+    return latencies, errors
+
+
+def main(args) -> None:
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    print(f"GET {args.path}, {args.clients} clients in {args.client_processes} processes, {args.duration:.0f} s per run")
+    print("workers    req/s   p50 ms   p99 ms  errors")
+    with ProcessPoolExecutor(args.client_processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for workers in range(1, args.max_workers + 1):
+            server = start_server(workers, args.port)
+            try:
+                # Let every worker finish its lifespan and open connections
+                measure(pool, url, argparse.Namespace(**{**vars(args), "duration": args.warmup}))
+                latencies, errors = measure(pool, url, args)
+            finally:
+                stop_server(server)
+            print(
+                f"{workers:7d} {len(latencies) / args.duration:8.0f} "
+                f"{percentile(latencies, 50):8.2f} {percentile(latencies, 99):8.2f} {errors:7d}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=cpu_count())
+    parser.add_argument("--path", default="/metrics", help="endpoint to request")
+    parser.add_argument("--clients", type=int, default=64, help="concurrent connections")
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8799)
+    main(parser.parse_args())
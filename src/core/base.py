@@ -10,6 +10,7 @@ DESCRIPTION: Base class for all LLMs in the application.
 from utils.config import setup_logger
 from abc import ABC, abstractmethod
 from typing import Any, AsyncGenerator
+from models.api import AgentStepResponse
 
 logger = setup_logger("llm_base.log")
 
@@ -24,7 +25,9 @@ class LLMBase(ABC):
         logger.info(f"{self.__class__.__name__} initialized with {llm.__class__.__name__}")
 
     @abstractmethod
-    async def generate(self, prompt: str, context: str, **kwargs: Any) -> AsyncGenerator[str, None]:
+    async def generate(
+        self, prompt: str, context: str, **kwargs: Any
+    ) -> AsyncGenerator[str | AgentStepResponse, None]:
         """Generate a response from the LLM."""
         if False:
             yield ""
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines an offline batch runner for evaluating prompt
+    changes against curated question sets. Records are streamed from a
+    JSONL file, answered with bounded concurrency under a provider rate
+    limit, written incrementally to a JSONL output and skipped on rerun
+    once answered, so an interrupted run can be resumed.
+
+    Usage (from the src directory):
+        python -m core.batch questions.jsonl answers.jsonl --concurrency 8 --rps 4
+"""
+
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from utils.config import setup_logger, settings
+from models.api import AgentStepResponse
+from utils.messages import extract_usage, message_text, token_cost
+from utils.metrics import percentile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from llms.router import needs_search
+from llms.models import AIChatCore
+from llms.factory import get_llm, model_name, provider_name
+import argparse
+import asyncio
+import json
+import time
+import os
+
+logger = setup_logger("batch.log")
+
+MESSAGE_FIELDS = ("message", "question", "prompt", "body")
+ID_FIELDS = ("id", "request_id")
+
+
+@dataclass
+class BatchRecord:
+    """A single question from the input file."""
+    id: str
+    message: str
+
+
+def iter_records(path: str, field: Optional[str] = None) -> Iterator[BatchRecord]:
+    """
+    Lazily read records from a JSONL file. The message is taken from `field`
+    or the first of `MESSAGE_FIELDS` present; the ID from `ID_FIELDS` or the
+    line number.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            fields = (field,) if field else MESSAGE_FIELDS
+            message = next((data[name] for name in fields if data.get(name)), None)
+            if message is None:
+                logger.warning(f"Skipping line {line_number}: no message field")
+                continue
+            record_id = next((str(data[name]) for name in ID_FIELDS if name in data), str(line_number))
+            yield BatchRecord(id=record_id, message=message)
+
+
+def completed_ids(path: str) -> set[str]:
+    """Return the IDs already answered without error in an output file."""
+    done: set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interruption is simply redone
+                continue
+            if not result.get("error"):
+                done.add(str(result["id"]))
+    return done
+
+
+class BatchRunner:
+    """
+    Runs question sets through `AIChatCore` with at most `concurrency`
+    model requests in flight. Questions that do not need web search are
+    grouped and sent with the chat model's `abatch`, taking one request
+    slot per question; the rest go through the search agent one by one.
+    """
+    def __init__(
+        self,
+        llm_name: str = "openai",
+        concurrency: int = 4,
+        requests_per_second: float = 2.0,
+        batch_size: int = 8,
+        search: str = "auto"
+    ):
+        self.llm_name = llm_name
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.search = search
+        self.rate_limiter = InMemoryRateLimiter(
+            requests_per_second=requests_per_second,
+            check_every_n_seconds=0.05,
+            max_bucket_size=max(1, batch_size)
+        )
+        self._chat_model = get_llm(llm_name, tools=False)
+        self._agent = get_llm(llm_name, tools=True) if search != "never" else None
+        self._write_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(concurrency)
+        self._slot_lock = asyncio.Lock()
+        self._latencies: List[float] = []
+        self._usage: Dict[str, int] = {}
+        self._processed = 0
+        self._failed = 0
+
+    def _use_search(self, record: BatchRecord) -> bool:
+        if self.search == "auto":
+            return needs_search(record.message).use_search
+        return self.search == "always"
+
+    async def run(self, input_path: str, output_path: str, field: Optional[str] = None) -> Dict[str, Any]:
+        """Answer every pending record of `input_path` and return a report."""
+        done = completed_ids(output_path)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * self.batch_size * 2)
+        start = time.perf_counter()
+        skipped = 0
+
+        with open(output_path, "a", encoding="utf-8") as output:
+            workers = [
+                asyncio.create_task(self._worker(queue, output))
+                for _ in range(self.concurrency)
+            ]
+            for record in iter_records(input_path, field):
+                if record.id in done:
+                    skipped += 1
+                    continue
+                await queue.put(record)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        elapsed = time.perf_counter() - start
+        return self.report(elapsed, skipped)
+
+    @asynccontextmanager
+    async def _slots(self, count: int) -> AsyncIterator[None]:
+        """
+        Hold `count` of the request slots shared by all workers. Slots are
+        taken under a lock so two groups never each hold part of what they need.
+        """
+        async with self._slot_lock:
+            for _ in range(count):
+                await self._in_flight.acquire()
+        try:
+            yield
+        finally:
+            for _ in range(count):
+                self._in_flight.release()
+
+    async def _worker(self, queue: asyncio.Queue, output) -> None:
+        """Take records off the queue in groups and answer them."""
+        # A group never needs more slots than there are
+        group_size = max(1, min(self.batch_size, self.concurrency))
+        while True:
+            record = await queue.get()
+            if record is None:
+                return
+            group = [record]
+            while len(group) < group_size and not queue.empty():
+                following = queue.get_nowait()
+                if following is None:
+                    # Put the stop signal back for after this group
+                    await queue.put(None)
+                    break
+                group.append(following)
+
+            direct = [r for r in group if not self._use_search(r)]
+            searched = [r for r in group if r not in direct]
+            if direct:
+                await self._answer_batch(direct, output)
+            for r in searched:
+                await self._answer_with_agent(r, output)
+
+    async def _answer_batch(self, records: List[BatchRecord], output) -> None:
+        """Answer several records in one `abatch` call to the chat model."""
+        for _ in records:
+            await self.rate_limiter.aacquire()
+        core = AIChatCore(self._chat_model)
+        inputs = [core.build_messages(r.message, "") for r in records]
+
+        start = time.perf_counter()
+        async with self._slots(len(inputs)):
+            results = await self._chat_model.abatch(
+                inputs, config={"max_concurrency": len(inputs)}, return_exceptions=True
+            )
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        for record, result in zip(records, results):
+            if isinstance(result, Exception):
+                await self._write(output, record, "direct", latency_ms, error=str(result))
+                continue
+            await self._write(
+                output, record, "direct", latency_ms,
+                answer=message_text(result), usage=extract_usage(result)
+            )
+
+    async def _answer_with_agent(self, record: BatchRecord, output) -> None:
+        """Answer a record through the web-search agent."""
+        await self.rate_limiter.aacquire()
+        core = AIChatCore(self._agent)
+        start = time.perf_counter()
+        try:
+            async with self._slots(1):
+                tokens = [
+                    token async for token in core.generate(record.message, "")
+                    if not isinstance(token, AgentStepResponse)
+                ]
+        except Exception as e:
+            await self._write(output, record, "agent", (time.perf_counter() - start) * 1000, error=str(e))
+            return
+        await self._write(
+            output, record, "agent", (time.perf_counter() - start) * 1000,
+            answer="".join(tokens), usage=core.usage
+        )
+
+    async def _write(
+        self,
+        output,
+        record: BatchRecord,
+        route: str,
+        latency_ms: float,
+        answer: str = "",
+        usage: Optional[Dict[str, int]] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """Append one result line and flush it so progress survives interruption."""
+        result = {
+            "id": record.id,
+            "message": record.message,
+            "answer": answer,
+            "route": route,
+            "latency_ms": round(latency_ms, 1),
+            "usage": usage or {},
+            "error": error,
+        }
+        async with self._write_lock:
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            if error:
+                self._failed += 1
+                logger.error(f"Record {record.id} failed: {error}")
+                return
+            self._processed += 1
+            self._latencies.append(latency_ms)
+            for key, value in (usage or {}).items():
+                self._usage[key] = self._usage.get(key, 0) + value
+
+    def report(self, elapsed: float, skipped: int = 0) -> Dict[str, Any]:
+        """Summarize throughput, latency percentiles, tokens and cost."""
+        input_tokens = self._usage.get("input_tokens", 0)
+        output_tokens = self._usage.get("output_tokens", 0)
+        provider = provider_name(self.llm_name)
+        cost = token_cost(self._usage, provider, model_name(provider))
+        return {
+            "processed": self._processed,
+            "failed": self._failed,
+            "skipped": skipped,
+            "elapsed_s": round(elapsed, 2),
+            "throughput_per_s": round(self._processed / elapsed, 3) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(self._latencies, 50), 1),
+                "p95": round(percentile(self._latencies, 95), 1),
+                "p99": round(percentile(self._latencies, 99), 1),
+            },
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": round(cost, 6),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a JSONL question set through the chat model.")
+    parser.add_argument("input", help="JSONL file of questions")
+    parser.add_argument("output", help="JSONL file answers are appended to")
+    parser.add_argument("--field", default=None, help="record field holding the question")
+    parser.add_argument("--llm", default=settings.get("llm_provider", "openai"))
+    parser.add_argument("--concurrency", type=int, default=4, help="model requests in flight at once")
+    parser.add_argument("--rps", type=float, default=2.0, help="provider requests per second")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--search", choices=("auto", "always", "never"), default="auto")
+    args = parser.parse_args()
+
+    runner = BatchRunner(
+        llm_name=args.llm,
+        concurrency=args.concurrency,
+        requests_per_second=args.rps,
+        batch_size=args.batch_size,
+        search=args.search
+    )
+    report = asyncio.run(runner.run(args.input, args.output, field=args.field))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
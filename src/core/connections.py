@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the registry of live WebSocket sessions. It bounds
+    the number of open sockets and the memory a single session may hold,
+    closes sessions left idle and drains open sessions on shutdown, so
+    in-flight turns are finished or persisted instead of dropped.
+"""
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+from utils.config import setup_logger, settings
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+from utils.metrics import metrics
+from core.engine import ChatTurn
+import asyncio
+import json
+import time
+import uuid
+
+logger = setup_logger("connections.log")
+
+# WebSocket close codes
+CLOSE_GOING_AWAY = 1001
+CLOSE_TOO_BIG = 1009
+CLOSE_SERVICE_RESTART = 1012
+CLOSE_TRY_AGAIN_LATER = 1013
+
+PING = "[PING]"
+
+
+class ConnectionLimitError(Exception):
+    """Raised when a session cannot be opened or exceeds its memory budget."""
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass(eq=False)
+class Session:
+    """A live WebSocket session."""
+    id: str
+    websocket: WebSocket
+    kind: str
+    connected_at: float = field(default_factory=time.monotonic)
+    last_active: float = field(default_factory=time.monotonic)
+    last_received: float = field(default_factory=time.monotonic)
+    received_bytes: int = 0
+    sent_bytes: int = 0
+    sent_frames: int = 0
+    turn: Optional[ChatTurn] = None
+    close_code: Optional[int] = None
+
+    @property
+    def buffered_bytes(self) -> int:
+        """
+        Estimate of the memory held for this session: its request and the
+        answer. The stream buffer holds the answer's tokens plus its step
+        frames, minus what was trimmed, so the answer is counted once.
+        """
+        if self.turn is None:
+            return self.received_bytes
+        return self.received_bytes + max(self.turn.nbytes, self.turn.stream.nbytes)
+
+    @property
+    def in_flight(self) -> bool:
+        return self.turn is not None and not self.turn.generation.done()
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+
+class ConnectionManager:
+    """
+    Tracks every open WebSocket session. New sessions are refused above
+    `max_connections` or while draining, and a session whose buffered
+    bytes exceed `max_session_bytes` is closed. A session is also closed
+    once the client has sent nothing for `idle_timeout`; while an answer
+    streams it is sent a [PING] frame every `ping_interval`, which the
+    client answers with any frame.
+    """
+    def __init__(
+        self,
+        max_connections: int,
+        max_session_bytes: int,
+        idle_timeout: float,
+        drain_timeout: float,
+        ping_interval: float
+    ):
+        self.max_connections = max_connections
+        self.max_session_bytes = max_session_bytes
+        self.idle_timeout = idle_timeout
+        self.drain_timeout = drain_timeout
+        self.ping_interval = ping_interval
+        self.draining = False
+        self._sessions: Dict[str, Session] = {}
+
+    async def connect(self, websocket: WebSocket, kind: str) -> Session:
+        """Accept a socket and register its session, or close it if refused."""
+        await websocket.accept()
+        if self.draining:
+            await self._refuse(websocket, "Server is shutting down", CLOSE_SERVICE_RESTART)
+        if len(self._sessions) >= self.max_connections:
+            await self._refuse(websocket, "Too many open connections", CLOSE_TRY_AGAIN_LATER)
+        session = Session(id=uuid.uuid4().hex, websocket=websocket, kind=kind)
+        self._sessions[session.id] = session
+        metrics.incr("ws.sessions_opened", kind=kind)
+        return session
+
+    async def _refuse(self, websocket: WebSocket, reason: str, code: int) -> None:
+        metrics.incr("ws.sessions_refused", code=code)
+        await websocket.close(code=code, reason=reason)
+        raise ConnectionLimitError(reason, code)
+
+    def disconnect(self, session: Session) -> None:
+        """Unregister a session once its handler is done."""
+        if self._sessions.pop(session.id, None) is not None:
+            metrics.observe("ws.session_ms", (time.monotonic() - session.connected_at) * 1000, kind=session.kind)
+
+    async def receive_json(self, session: Session) -> Any:
+        """
+        Receive one JSON message, closing the session if the client stays
+        silent for the idle timeout or sends more than its byte budget.
+        """
+        try:
+            text = await asyncio.wait_for(session.websocket.receive_text(), timeout=self.idle_timeout)
+        except asyncio.TimeoutError:
+            await self._evict_idle(session)
+            raise ConnectionLimitError("Idle timeout", CLOSE_GOING_AWAY)
+        session.received_bytes = len(text.encode("utf-8"))
+        session.last_received = time.monotonic()
+        session.touch()
+        self.check(session)
+        return json.loads(text)
+
+    async def wait_for_disconnect(self, session: Session) -> None:
+        """
+        Return once the client disconnects, recording the close code, or
+        once it has sent nothing for the idle timeout, e.g. a half-open
+        socket. Frames received meanwhile, such as ping replies, are ignored.
+        """
+        while True:
+            idle_for = time.monotonic() - session.last_received
+            if idle_for >= self.idle_timeout:
+                await self._evict_idle(session)
+                session.close_code = CLOSE_GOING_AWAY
+                return
+            timeout = min(self.ping_interval, self.idle_timeout - idle_for)
+            try:
+                message = await asyncio.wait_for(session.websocket.receive(), timeout=timeout)
+            except asyncio.TimeoutError:
+                try:
+                    await self.send_text(session, PING)
+                except (WebSocketDisconnect, ConnectionLimitError, RuntimeError):
+                    pass
+                continue
+            if message["type"] == "websocket.disconnect":
+                session.close_code = message.get("code")
+                return
+            session.last_received = time.monotonic()
+
+    async def send_text(self, session: Session, frame: str) -> None:
+        """
+        Send a frame, enforcing the session's byte budget first. A send that
+        blocks for the idle timeout, because the peer stopped reading, is
+        treated as a disconnect.
+        """
+        self.check(session)
+        try:
+            await asyncio.wait_for(session.websocket.send_text(frame), timeout=self.idle_timeout)
+        except asyncio.TimeoutError:
+            await self._evict_idle(session)
+            raise WebSocketDisconnect(CLOSE_GOING_AWAY, "Send timed out")
+        session.sent_bytes += len(frame.encode("utf-8"))
+        session.sent_frames += 1
+        session.touch()
+
+    async def _evict_idle(self, session: Session) -> None:
+        metrics.incr("ws.sessions_evicted", reason="idle")
+        await self.close(session, CLOSE_GOING_AWAY, "Idle timeout")
+
+    def check(self, session: Session) -> None:
+        """Raise if the session holds more than its byte budget."""
+        if session.buffered_bytes > self.max_session_bytes:
+            metrics.incr("ws.sessions_evicted", reason="memory")
+            raise ConnectionLimitError(
+                f"Session exceeded {self.max_session_bytes} buffered bytes", CLOSE_TOO_BIG
+            )
+
+    async def close(self, session: Session, code: int, reason: str = "") -> None:
+        """Close a session's socket if it is still open."""
+        if session.websocket.client_state is WebSocketState.CONNECTED:
+            try:
+                # Bounded, since a half-open peer never reads the close frame
+                await asyncio.wait_for(session.websocket.close(code=code, reason=reason), timeout=5.0)
+            except Exception as e:
+                logger.debug(f"Failed to close session {session.id}: {e}")
+
+    async def drain(self) -> None:
+        """
+        Stop accepting sessions, close those without a turn in flight and
+        wait up to the drain timeout for the rest to finish their turns.
+        """
+        self.draining = True
+        for session in list(self._sessions.values()):
+            if not session.in_flight:
+                await self.close(session, CLOSE_SERVICE_RESTART, "Server is shutting down")
+
+        deadline = time.monotonic() + self.drain_timeout
+        while self._sessions and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._sessions:
+            logger.warning(f"{len(self._sessions)} sessions still open after draining")
+        for session in list(self._sessions.values()):
+            await self.close(session, CLOSE_SERVICE_RESTART, "Server is shutting down")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return live session counts and memory estimates for the metrics endpoint."""
+        sessions = list(self._sessions.values())
+        buffered = [session.buffered_bytes for session in sessions]
+        by_kind: Dict[str, int] = {}
+        for session in sessions:
+            by_kind[session.kind] = by_kind.get(session.kind, 0) + 1
+        return {
+            "sessions": len(sessions),
+            "by_kind": by_kind,
+            "in_flight_turns": sum(1 for session in sessions if session.in_flight),
+            "max_connections": self.max_connections,
+            "buffered_bytes": sum(buffered),
+            "max_session_buffered_bytes": max(buffered, default=0),
+            "max_session_bytes": self.max_session_bytes,
+            "draining": self.draining,
+        }
+
+
+connections = ConnectionManager(
+    max_connections=settings.get("ws_max_connections", 1000),
+    max_session_bytes=settings.get("ws_max_session_bytes", 1024 * 1024),
+    idle_timeout=settings.get("ws_idle_timeout", 60.0),
+    drain_timeout=settings.get("ws_drain_timeout", 25.0),
+    ping_interval=settings.get("ws_ping_interval", 20.0),
+)
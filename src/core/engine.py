@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the chat-turn engine shared by every chat
+    transport (WebSocket, Server-Sent Events and plain JSON). It routes
+    the message, fetches history, runs generation into a replay buffer
+    and persists the turn, so all transports get the same caching,
+    pooling, cancellation and persistence behaviour.
+"""
+
+from llms.router import (
+    asks_question, classify_intent, canned_reply, needs_last_reply, needs_search, record_route
+)
+from memory.streams import StreamBuffer, stream_registry
+from llms.factory import get_llm, get_small_talk_llm, model_name, provider_name
+from memory.supabase import SupabaseMemoryManager
+from rag.retriever import (
+    EmbeddingMismatchError, KnowledgeRetriever, format_knowledge, get_retriever, retriever_error, retriever_loaded
+)
+from memory.usage import UsageRollups
+from rag.index import RetrievedChunk
+from core.pipeline import Pipeline
+from dataclasses import dataclass, field
+from models.supabase import MessageBatch, MessageRecord
+from memory.compression import compress_history, estimate_tokens
+from utils.offload import cpu_pool
+from typing import AsyncGenerator, Optional
+from models.api import AgentStepResponse, UserInput
+from utils.types import Route, Sender
+from llms.models import AIChatCore
+from utils.tracing import Span, tracer
+from utils.messages import token_cost
+from utils.metrics import metrics
+from utils.config import settings
+from loguru._logger import Logger
+import logging
+import asyncio
+import time
+
+
+async def _stream_text(text: str) -> AsyncGenerator[str, None]:
+    """Stream a precomputed reply through the same path as model output."""
+    yield text
+
+
+@dataclass
+class RoutePlan:
+    """How a message will be answered."""
+    route: Route
+    tokens: AsyncGenerator
+    model: Optional[AIChatCore] = None
+    summary: Optional[asyncio.Task] = None
+    knowledge: list[RetrievedChunk] = field(default_factory=list)
+    context: Optional[dict] = None
+
+
+@dataclass
+class ChatTurn:
+    """State of a single in-flight chat turn."""
+    user_input: UserInput
+    route: Route
+    model: Optional[AIChatCore]
+    stream: StreamBuffer
+    started: float
+    resumable: bool = True
+    ai_tokens: list[str] = field(default_factory=list)
+    nbytes: int = 0
+    truncated: bool = False
+    generation: Optional[asyncio.Task] = None
+    span: Optional[Span] = None
+    summary: Optional[asyncio.Task] = None
+    knowledge: list[RetrievedChunk] = field(default_factory=list)
+    context: Optional[dict] = None
+
+    @property
+    def message(self) -> str:
+        """The assistant message produced so far."""
+        return "".join(self.ai_tokens)
+
+
+class ChatTurnEngine:
+    """
+    Runs chat turns independently of the transport. Transports start a
+    turn, relay its stream frames to the client, call `abandon` if the
+    client goes away and finally `finish` to persist the turn.
+    """
+    def __init__(
+        self,
+        logger: Logger | logging.Logger
+    ):
+        self.logger = logger
+        self._memory: Optional[SupabaseMemoryManager] = None
+        self._llms: dict[tuple[str, str], object] = {}
+        self._background: set[asyncio.Task] = set()
+        self.usage = UsageRollups(lambda: self.memory)
+
+    @property
+    def memory(self) -> SupabaseMemoryManager:
+        """Shared Supabase manager, so its client and connections are reused."""
+        if self._memory is None:
+            self._memory = SupabaseMemoryManager(self.logger)
+        return self._memory
+
+    def _llm(self, llm_name: str, route: Route):
+        """Return a cached model/agent for the provider and route."""
+        key = (llm_name, route.value)
+        if key not in self._llms:
+            with tracer.span("llm.get_llm", provider=llm_name, route=route.value):
+                if route is Route.SMALL_TALK:
+                    self._llms[key] = get_small_talk_llm(llm_name)
+                else:
+                    self._llms[key] = get_llm(llm_name, tools=route is Route.AGENT)
+        return self._llms[key]
+
+    async def _acquire_memory(self) -> SupabaseMemoryManager:
+        """Return the shared Supabase manager, creating its client off the event loop."""
+        if self._memory is None:
+            self._memory = await asyncio.to_thread(SupabaseMemoryManager, self.logger)
+        return self._memory
+
+    async def _acquire_llm(self, llm_name: str, route: Route):
+        """Return the cached model/agent, building it off the event loop on first use."""
+        if (llm_name, route.value) in self._llms:
+            return self._llms[(llm_name, route.value)]
+        return await asyncio.to_thread(self._llm, llm_name, route)
+
+    async def warm(self) -> None:
+        """
+        Build this worker's Supabase client, default models and knowledge
+        index before the first turn needs them.
+        """
+        provider = provider_name(settings.get("llm_provider", "openai"))
+        results = await asyncio.gather(
+            self._acquire_memory(),
+            self._acquire_llm(provider, Route.DIRECT),
+            self._acquire_llm(provider, Route.AGENT),
+            asyncio.to_thread(get_retriever),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.warning(f"Failed to warm engine state: {result}")
+        # An index built with another embedder cannot be searched; other load
+        # errors leave the server answering without retrieval
+        if isinstance(retriever_error(), EmbeddingMismatchError):
+            raise retriever_error()
+
+    async def start(self, user_input: UserInput, resumable: bool = True) -> ChatTurn:
+        """
+        Route the message, prepare the model and context and start
+        generating into a replay buffer.
+        """
+        if not user_input.user_id or not user_input.message:
+            raise ValueError("user_id and message are required fields.")
+        # Models, traces and usage rollups are keyed on the provider
+        user_input.llm = provider_name(user_input.llm)
+
+        # Every span of the turn, including those of the generation task
+        # started below, belongs to this trace
+        root = tracer.start_span(
+            "chat.turn",
+            user_id=user_input.user_id,
+            chat_id=user_input.chat_id or "",
+            llm=user_input.llm
+        )
+        try:
+            with tracer.activate(root):
+                started = time.perf_counter()
+                plan = await self._route(user_input)
+                root.set_attribute("route", plan.route.value)
+
+                turn = ChatTurn(
+                    user_input=user_input,
+                    route=plan.route,
+                    model=plan.model,
+                    stream=stream_registry.create(),
+                    started=started,
+                    resumable=resumable,
+                    span=root,
+                    summary=plan.summary,
+                    knowledge=plan.knowledge,
+                    context=plan.context
+                )
+                turn.generation = asyncio.create_task(self._produce(turn, plan.tokens))
+        except BaseException as e:
+            tracer.end_span(root, error=e)
+            raise
+        return turn
+
+    async def _route(
+        self, user_input: UserInput
+    ) -> RoutePlan:
+        """Pick the route for a message and prepare its token stream."""
+        route = Route.AGENT
+        intent = None
+        if settings.get("small_talk_routing", True):
+            intent = classify_intent(
+                user_input.message,
+                threshold=settings.get("small_talk_threshold", 0.8)
+            )
+            route = intent.route
+            if needs_last_reply(intent) and await self._answers_question(user_input):
+                # "Sure" to the assistant's offer needs the history and a model
+                self.logger.info(f"{intent.label} answers the assistant's question, not canned")
+                metrics.incr("chat.canned_deferred", label=intent.label)
+                route = Route.AGENT
+
+        if route is Route.CANNED and intent is not None:
+            # Greetings, thanks and acknowledgements of a finished answer need neither history nor a model call
+            plan = RoutePlan(route=route, tokens=_stream_text(canned_reply(intent)))
+        elif route is Route.SMALL_TALK:
+            # Small talk goes to a plain, tool-less model with a small token budget
+            model = AIChatCore(
+                llm=await self._acquire_llm(user_input.llm, route),
+                system_prompt=settings.get("small_talk_prompt")
+            )
+            plan = RoutePlan(route=route, tokens=model.generate(user_input.message, ""), model=model)
+        else:
+            # Only pay for the agent's tool-decision step when search is worth it
+            decision = needs_search(user_input.message, user_input.enable_search)
+            route = Route.AGENT if decision.use_search else Route.DIRECT
+            metrics.incr("chat.search_decision", reason=decision.reason, route=route.value)
+            self.logger.info(f"Search decision: {decision}")
+
+            # Client setup, model acquisition, the history fetch and knowledge
+            # retrieval overlap; generation waits only for what it needs
+            pipeline = Pipeline()
+            pipeline.stage("memory", self._acquire_memory)
+            pipeline.stage("llm", lambda: self._acquire_llm(user_input.llm, route))
+            pipeline.stage(
+                "history",
+                lambda memory: memory.get_conversation_history(
+                    user_id=user_input.user_id,
+                    chat_id=user_input.chat_id
+                ),
+                "memory"
+            )
+            stages = ["llm", "history"]
+            # Loaded at startup; only a worker that skipped warm loads it here
+            retriever = get_retriever() if retriever_loaded() else await asyncio.to_thread(get_retriever)
+            if retriever is not None:
+                pipeline.stage("knowledge", lambda: self._retrieve(retriever, user_input.message))
+                stages.append("knowledge")
+            try:
+                llm, context, *knowledge = await pipeline.results(*stages)
+            except BaseException:
+                pipeline.cancel()
+                raise
+            self.logger.debug(f"Retrieved {len(context)} context messages")
+            knowledge = knowledge[0] if knowledge else []
+
+            model = AIChatCore(llm=llm)
+            context_str, context_stats = await self._assemble_context(context)
+
+            # The summary is not part of the prompt, so it runs alongside generation
+            summary = pipeline.stage("summarize", lambda: self._summarize(model, context_str))
+            self._track(summary)
+            self.logger.info(f"Stage timings (ms): {pipeline.timings}")
+
+            if knowledge:
+                context_str = f"{context_str}\n\n{format_knowledge(knowledge)}".strip()
+            plan = RoutePlan(
+                route=route,
+                tokens=model.generate(user_input.message, context_str),
+                model=model,
+                summary=summary,
+                knowledge=knowledge,
+                context=context_stats
+            )
+        self.logger.info(f"Message routed to {route.value}")
+        return plan
+
+    async def _answers_question(self, user_input: UserInput) -> bool:
+        """
+        Whether the assistant's last answer in the chat asked the user
+        something. When that cannot be checked, the message is treated as
+        an answer, so it goes down the path that reads history.
+        """
+        if not user_input.chat_id:
+            return False
+        try:
+            memory = await self._acquire_memory()
+            last = await memory.get_last_message(user_input.user_id, user_input.chat_id, Sender.SYSTEM.value)
+        except Exception as e:
+            self.logger.error(f"Error fetching the last answer: {e}")
+            return True
+        return last is not None and asks_question(last)
+
+    async def _assemble_context(self, history: MessageBatch) -> tuple[str, dict]:
+        """
+        Render the history for the prompt, compressed unless
+        CONTEXT_COMPRESSION is off, and record the estimated token savings.
+        """
+        start = time.perf_counter()
+        if settings.get("context_compression", True):
+            compressed = await cpu_pool.run(compress_history, history, size=len(history))
+            text, stats = compressed.text, {
+                "mode": "compressed",
+                "tokens": compressed.tokens,
+                "compressed_tokens": compressed.compressed_tokens,
+                "dropped_turns": compressed.dropped_turns,
+            }
+        else:
+            text = await cpu_pool.run(MessageBatch.transcript, history, size=len(history))
+            stats = {"mode": "raw", "tokens": estimate_tokens(text), "compressed_tokens": estimate_tokens(text), "dropped_turns": 0}
+        metrics.observe("context.assemble_ms", (time.perf_counter() - start) * 1000, mode=stats["mode"])
+        metrics.observe("context.tokens", stats["tokens"], mode=stats["mode"])
+        metrics.observe("context.saved_tokens", stats["tokens"] - stats["compressed_tokens"], mode=stats["mode"])
+        return text, stats
+
+    async def _retrieve(self, retriever: KnowledgeRetriever, query: str) -> list[RetrievedChunk]:
+        """Search the local knowledge base without failing the turn."""
+        try:
+            return await asyncio.to_thread(
+                retriever.search,
+                query,
+                k=settings.get("rag_top_k", 4),
+                min_score=settings.get("rag_min_score", 0.2),
+                nprobe=settings.get("rag_nprobe", 8)
+            )
+        except Exception as e:
+            self.logger.error(f"Error retrieving knowledge: {e}")
+            return []
+
+    async def _summarize(self, model: AIChatCore, context: str) -> None:
+        """Summarize the history for the logs without failing the turn."""
+        try:
+            context_summary = await model.summarize(context)
+            self.logger.info(f"Context summary generated: {context_summary}")
+        except Exception as e:
+            self.logger.error(f"Error summarizing context: {e}")
+
+    def _track(self, task: asyncio.Task) -> None:
+        """Keep a reference to a background task until it is done."""
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _produce(self, turn: ChatTurn, tokens: AsyncGenerator) -> None:
+        """Write generated tokens and agent steps into the turn's stream."""
+        stream = turn.stream
+        try:
+            async for token in tokens:
+                if isinstance(token, AgentStepResponse):
+                    # Tool-call progress is sent as a tagged JSON frame
+                    stream.append(f"[STEP] {token.model_dump_json()}")
+                    continue
+                if not turn.ai_tokens:
+                    ttft = (time.perf_counter() - turn.started) * 1000
+                    metrics.observe("chat.ttft_ms", ttft, route=turn.route.value)
+                    if turn.context is not None:
+                        # Compare answer latency with and without context compression
+                        metrics.observe("context.ttft_ms", ttft, mode=turn.context["mode"])
+                turn.ai_tokens.append(token)
+                turn.nbytes += len(token.encode("utf-8"))
+                stream.append(token)
+            stream.append("[DONE]")
+        except Exception as e:
+            stream.append(f"[ERROR] {e}")
+            raise
+        finally:
+            stream.finish()
+
+    async def abandon(self, turn: ChatTurn) -> None:
+        """
+        Handle a client that went away mid-answer. The generation keeps
+        running while a client may resume the stream; otherwise it is
+        cancelled within a bounded time and the turn marked truncated.
+        """
+        tokens_at_disconnect = len(turn.ai_tokens)
+        if turn.resumable and await self._wait_for_resume(turn):
+            return
+        turn.truncated = True
+        await self._cancel_generation(turn, tokens_at_disconnect)
+        self.logger.warning(f"Client {turn.user_input.user_id} disconnected, generation cancelled")
+
+    async def truncate(self, turn: ChatTurn) -> None:
+        """Stop a generation early, e.g. when its session hit a memory cap."""
+        turn.truncated = True
+        await self._cancel_generation(turn, len(turn.ai_tokens))
+
+    async def wind_down(self, turn: ChatTurn, timeout: float) -> None:
+        """
+        Handle a client disconnected by a server shutdown. Nobody can resume
+        on this worker, so the generation gets up to `timeout` seconds to
+        complete before it is cut short.
+        """
+        await asyncio.wait({turn.generation}, timeout=timeout)
+        if not turn.generation.done():
+            await self.truncate(turn)
+            self.logger.warning(f"Turn of user {turn.user_input.user_id} truncated at shutdown")
+
+    async def drain(self, timeout: float) -> None:
+        """Wait up to `timeout` seconds for background turn work to complete."""
+        pending = {task for task in self._background if not task.done()}
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        if pending:
+            self.logger.warning(f"{len(pending)} background tasks still running at shutdown")
+
+    def finish_in_background(self, turn: ChatTurn, abandoned: bool = False) -> None:
+        """
+        Finish a turn (abandoning it first if the client went away) from a
+        task of its own, for transports whose handler cannot await it, e.g.
+        because the disconnect is cancelling the handler itself.
+        """
+        async def _run() -> None:
+            if abandoned:
+                await self.abandon(turn)
+            await self.finish(turn)
+
+        self._track(asyncio.create_task(_run()))
+
+    async def _wait_for_resume(self, turn: ChatTurn) -> bool:
+        """
+        Keep a generation running while its client may reconnect. Returns True
+        once the generation finishes, or False if nobody has been reading the
+        stream for the resume grace period.
+        """
+        generation, stream = turn.generation, turn.stream
+        grace = settings.get("stream_resume_grace", 5.0)
+        while not generation.done():
+            # Resumes on other workers follow the spool instead of subscribing
+            if stream.subscribers or stream.has_remote_reader:
+                await asyncio.wait({generation}, timeout=grace)
+                continue
+            attached = asyncio.create_task(stream.wait_for_subscriber())
+            done, _ = await asyncio.wait(
+                {generation, attached}, timeout=grace, return_when=asyncio.FIRST_COMPLETED
+            )
+            attached.cancel()
+            if not done and not stream.has_remote_reader:
+                return False
+        return True
+
+    async def _cancel_generation(self, turn: ChatTurn, tokens_at_disconnect: int) -> None:
+        """
+        Cancel an in-flight generation and wait a bounded time for it to stop,
+        recording the cancellation latency and the tokens produced after the
+        client had already gone.
+        """
+        cancel_start = time.perf_counter()
+        turn.generation.cancel()
+        try:
+            await asyncio.wait_for(turn.generation, timeout=settings.get("cancel_timeout", 2.0))
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            self.logger.debug(f"Generation ended with error after disconnect: {e}")
+
+        produced = len(turn.ai_tokens)
+        metrics.incr("chat.cancelled_turns")
+        metrics.observe("chat.cancel_latency_ms", (time.perf_counter() - cancel_start) * 1000)
+        metrics.observe("chat.wasted_tokens", max(0, produced - tokens_at_disconnect))
+        metrics.observe("chat.truncated_tokens", produced)
+
+    async def finish(self, turn: ChatTurn) -> Optional[BaseException]:
+        """
+        Wait for the generation to end, record metrics and persist the turn.
+        Returns the generation error, if any, in which case nothing is persisted.
+        """
+        await asyncio.wait({turn.generation})
+        if not turn.resumable:
+            stream_registry.discard(turn.stream.stream_id)
+        if not turn.generation.cancelled() and turn.generation.exception() is not None:
+            error = turn.generation.exception()
+            self.logger.error(f"Error generating response: {error}")
+            self._end_trace(turn, error)
+            return error
+
+        record_route(turn.route, (time.perf_counter() - turn.started) * 1000)
+        # The summary's model call is part of the turn's usage
+        if turn.summary is not None:
+            await asyncio.wait({turn.summary})
+        usage = self.turn_usage(turn)
+        for key in ("input_tokens", "output_tokens", "total_tokens"):
+            metrics.observe(f"chat.{key}", usage[key], route=turn.route.value)
+        metrics.observe("chat.cost_usd", usage["cost_usd"], route=turn.route.value)
+        for provider, provider_usage in self.usage_by_provider(turn).items():
+            self.usage.record(
+                turn.user_input.user_id,
+                provider,
+                provider_usage,
+                token_cost(provider_usage, provider, model_name(provider)),
+                turns=int(provider == turn.user_input.llm)
+            )
+        self.logger.info(f"Completed response for user {turn.user_input.user_id}")
+
+        if turn.span is None:
+            await self.persist(turn)
+        else:
+            with tracer.activate(turn.span), tracer.span("chat.persist"):
+                await self.persist(turn)
+        self._end_trace(turn)
+        return None
+
+    @classmethod
+    def turn_usage(cls, turn: ChatTurn) -> dict:
+        """Token usage and estimated cost of every model call of a turn."""
+        usage = dict(turn.model.usage) if turn.model is not None else {}
+        cost = sum(
+            token_cost(provider_usage, provider, model_name(provider))
+            for provider, provider_usage in cls.usage_by_provider(turn).items()
+        )
+        return {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+            "cost_usd": round(cost, 6),
+            "calls": list(turn.model.calls) if turn.model is not None else [],
+        }
+
+    @staticmethod
+    def usage_by_provider(turn: ChatTurn) -> dict[str, dict[str, int]]:
+        """
+        Token usage of a turn per provider that served it. Calls without a
+        provider of their own, such as the answer, count for the turn's.
+        """
+        usage: dict[str, dict[str, int]] = {turn.user_input.llm: {}}
+        for call in turn.model.calls if turn.model is not None else []:
+            totals = usage.setdefault(call.get("provider", turn.user_input.llm), {})
+            for key in ("input_tokens", "output_tokens", "total_tokens"):
+                totals[key] = totals.get(key, 0) + call.get(key, 0)
+        return usage
+
+    def _end_trace(self, turn: ChatTurn, error: Optional[BaseException] = None) -> None:
+        """End the root span of a turn."""
+        if turn.span is None:
+            return
+        turn.span.set_attribute("tokens", len(turn.ai_tokens))
+        turn.span.set_attribute("truncated", turn.truncated)
+        tracer.end_span(turn.span, error=error)
+
+    async def persist(self, turn: ChatTurn) -> None:
+        """Persist the user message and the (possibly partial) answer."""
+        user_input = turn.user_input
+
+        # Save user message
+        user_message = MessageRecord(
+            user_id=user_input.user_id,
+            chat_id=user_input.chat_id,
+            sender=Sender.USER,
+            message=user_input.message,
+            meta={
+            "chat_id": user_input.chat_id,
+            "llm_provider": user_input.llm,
+            "temperature": user_input.temperature,
+            "username": user_input.username,
+            "route": turn.route.value
+            }
+        )
+
+        # Save AI response
+        ai_message = MessageRecord(
+            user_id=user_input.user_id,
+            chat_id=user_input.chat_id,
+            sender=Sender.SYSTEM,
+            message=turn.message,
+            meta={
+            "chat_id": user_input.chat_id,
+            "llm_provider": user_input.llm,
+            "temperature": user_input.temperature,
+            "route": turn.route.value,
+            "truncated": turn.truncated,
+            "trace_id": turn.span.trace_id if turn.span else None,
+            "usage": self.turn_usage(turn),
+            "knowledge": [
+                {"source": chunk.source, "title": chunk.title, "score": round(chunk.score, 4)}
+                for chunk in turn.knowledge
+            ],
+            "context": turn.context
+            }
+        )
+
+        # Persist to Supabase asynchronously
+        try:
+            memory = await self._acquire_memory()
+            await memory.add_message_record(user_message)
+            await memory.add_message_record(ai_message)
+            self.logger.info("Messages persisted to Supabase successfully")
+        except Exception as e:
+            self.logger.error(f"Failed to persist messages to Supabase: {e}")
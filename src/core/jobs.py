@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines a small in-process registry of background jobs,
+    such as chat deletion and retention archival, so long-running data
+    maintenance does not block a request and its progress can be polled.
+    Job progress is also written to a directory shared by the instance's
+    workers, so any of them can answer a poll.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+from utils.config import setup_logger, settings
+from dataclasses import dataclass, field
+from utils.instance import shared_dir
+from collections import OrderedDict
+from utils.types import JobStatus
+from datetime import datetime
+import asyncio
+import string
+import json
+import time
+import uuid
+import os
+
+logger = setup_logger("jobs.log")
+
+
+@dataclass
+class Job:
+    """Progress of one background job."""
+    id: str
+    kind: str
+    status: JobStatus = JobStatus.PENDING
+    processed: int = 0
+    total: Optional[int] = None
+    detail: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    on_change: Optional[Callable[["Job"], None]] = field(default=None, repr=False, compare=False)
+
+    def progress(self, processed: int, total: Optional[int] = None) -> None:
+        """Record how many items have been handled so far."""
+        self.processed = processed
+        if total is not None:
+            self.total = total
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status.value,
+            "processed": self.processed,
+            "total": self.total,
+            "detail": self.detail,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        return cls(
+            id=data["id"],
+            kind=data["kind"],
+            status=JobStatus(data["status"]),
+            processed=data["processed"],
+            total=data["total"],
+            detail=data["detail"],
+            error=data["error"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+            finished_at=datetime.fromisoformat(data["finished_at"]) if data["finished_at"] else None,
+        )
+
+
+class JobRegistry:
+    """
+    Runs jobs as asyncio tasks and keeps the most recent ones for polling.
+    Each job's state is saved to `state_dir` when it starts and ends, and
+    at most every `save_interval` seconds while it makes progress; files
+    older than `ttl` are removed.
+    """
+    def __init__(self, max_jobs: int = 256, state_dir: str = "", ttl: float = 86400.0, save_interval: float = 0.5):
+        self.max_jobs = max_jobs
+        self.state_dir = state_dir
+        self.ttl = ttl
+        self.save_interval = save_interval
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+        self._saved_at: Dict[str, float] = {}
+        if state_dir:
+            try:
+                os.makedirs(state_dir, exist_ok=True)
+            except OSError as e:
+                logger.error(f"Job state is not shared, cannot create {state_dir}: {e}")
+                self.state_dir = ""
+
+    def submit(self, kind: str, run: Callable[[Job], Awaitable[Any]], **detail: Any) -> Job:
+        """Start `run(job)` in the background and return the job."""
+        job = Job(id=uuid.uuid4().hex, kind=kind, detail=detail, on_change=self._save)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._saved_at.pop(self._jobs.popitem(last=False)[0], None)
+        self._sweep()
+        self._save(job, force=True)
+
+        task = asyncio.create_task(self._run(job, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job of this worker, or one another worker saved."""
+        job = self._jobs.get(job_id)
+        if job is not None or not self.state_dir or not all(c in string.hexdigits for c in job_id):
+            return job
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return Job.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot read the state of job {job_id}: {e}")
+            return None
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job: Job, force: bool = False) -> None:
+        if not self.state_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._saved_at.get(job.id, 0.0) < self.save_interval:
+            return
+        self._saved_at[job.id] = now
+        path = self._path(job.id)
+        try:
+            # Replace the file whole so readers never see a partial write
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(job.to_dict(), f)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning(f"Cannot save the state of job {job.id}: {e}")
+
+    def _sweep(self) -> None:
+        if not self.state_dir:
+            return
+        now = time.time()
+        try:
+            with os.scandir(self.state_dir) as entries:
+                for entry in entries:
+                    try:
+                        if now - entry.stat().st_mtime > self.ttl:
+                            os.unlink(entry.path)
+                    except OSError:
+                        pass
+        except OSError as e:
+            logger.warning(f"Cannot sweep job state: {e}")
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[Any]]) -> None:
+        job.status = JobStatus.RUNNING
+        self._save(job, force=True)
+        try:
+            await run(job)
+            job.status = JobStatus.SUCCEEDED
+            logger.info(f"Job {job.kind} {job.id} processed {job.processed} items")
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            logger.error(f"Job {job.kind} {job.id} failed after {job.processed} items: {e}")
+        finally:
+            job.finished_at = datetime.now()
+            self._save(job, force=True)
+
+
+jobs = JobRegistry(state_dir=shared_dir("jobs", settings.get("job_state_dir", "")))
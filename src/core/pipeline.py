@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines a small dependency-aware pipeline for the stages
+    of a chat turn. Each stage starts as soon as the stages it depends on
+    have finished, so independent work (model acquisition, client setup,
+    history fetch) overlaps instead of running one after another. Every
+    stage is timed into the metrics registry and traced as a span.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List
+from utils.metrics import metrics
+from utils.tracing import tracer
+import asyncio
+import time
+
+
+class Pipeline:
+    """
+    Runs named async stages as tasks, feeding each stage the results of
+    its dependencies in the order they are listed.
+    """
+    def __init__(self, name: str = "chat"):
+        self.name = name
+        self.timings: Dict[str, float] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def stage(self, name: str, run: Callable[..., Awaitable[Any]], *depends_on: str) -> asyncio.Task:
+        """
+        Schedule `run(*dependency_results)` to start once `depends_on` are done.
+        Returns the stage's task; a failed dependency fails the stage too.
+        """
+        dependencies = [self._tasks[dependency] for dependency in depends_on]
+
+        async def _run() -> Any:
+            results = [await dependency for dependency in dependencies]
+            start = time.perf_counter()
+            try:
+                with tracer.span(f"stage.{name}"):
+                    return await run(*results)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                self.timings[name] = elapsed
+                metrics.observe(f"{self.name}.stage_ms", elapsed, stage=name)
+
+        task = asyncio.create_task(_run())
+        self._tasks[name] = task
+        return task
+
+    async def results(self, *names: str) -> List[Any]:
+        """Wait for the given stages and return their results in order."""
+        return list(await asyncio.gather(*(self._tasks[name] for name in names)))
+
+    def cancel(self) -> None:
+        """Cancel all stages that are still running."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
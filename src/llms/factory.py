@@ -13,11 +13,82 @@ from langchain_community.tools import DuckDuckGoSearchRun
 from langgraph.prebuilt import create_react_agent
 from utils.config import setup_logger, settings
 from langchain_anthropic import ChatAnthropic
+from llms.transport import provider_pools
 from langchain_openai import ChatOpenAI
+from typing import Optional
+import anthropic
 
 logger = setup_logger("llm_factory.log")
 
-def get_llm(llm_name: str = "openai"):
+ANTHROPIC_MODEL = "claude-3"
+
+
+# Set once an Anthropic model was found ignoring the shared pool
+_anthropic_pool_unsupported = False
+
+
+def _with_shared_pool(llm: ChatAnthropic) -> ChatAnthropic:
+    """
+    Point an Anthropic model at the shared connection pool. ChatAnthropic
+    has no client argument (langchain-anthropic is pinned in pyproject.toml
+    for this), so its cached async client is replaced here and checked.
+    """
+    global _anthropic_pool_unsupported
+    client = provider_pools.client("anthropic")
+    if client is None or _anthropic_pool_unsupported:
+        return llm
+    try:
+        llm.__dict__["_async_client"] = anthropic.AsyncClient(**llm._client_params, http_client=client)
+    except (AttributeError, TypeError) as e:
+        # Another langchain-anthropic or SDK release changed these internals
+        logger.error(f"Anthropic models keep their own HTTP clients: {e}")
+        _anthropic_pool_unsupported = True
+        return llm
+    if not uses_shared_pool(llm):
+        logger.error("Anthropic models ignore the shared HTTP pool; check the pinned langchain-anthropic version")
+        _anthropic_pool_unsupported = True
+    return llm
+
+
+def uses_shared_pool(llm: ChatAnthropic) -> bool:
+    """Whether an Anthropic model sends its requests through the shared pool."""
+    client = provider_pools.client("anthropic")
+    try:
+        return client is not None and llm._async_client._client is client
+    except AttributeError:
+        return False
+
+
+def check_shared_pools() -> None:
+    """
+    Startup guard: build an Anthropic model as turns would and log whether
+    it actually uses the shared connection pool.
+    """
+    if provider_pools.client("anthropic") is None:
+        return
+    try:
+        llm = get_small_talk_llm("anthropic")
+    except Exception as e:
+        logger.warning(f"Could not check the Anthropic connection pool: {e}")
+        return
+    if uses_shared_pool(llm):
+        logger.info("Anthropic models use the shared HTTP pool")
+
+
+def provider_name(llm_name: Optional[str]) -> str:
+    """
+    Map a client's `llm` value to the provider `get_llm` actually uses, so
+    unknown names share OpenAI's cached models and usage rollups.
+    """
+    return "anthropic" if llm_name == "anthropic" else "openai"
+
+
+def model_name(provider: str) -> str:
+    """The chat model `get_llm` uses for a provider, for pricing its usage."""
+    return ANTHROPIC_MODEL if provider == "anthropic" else settings.get("model_name", "gpt-4o-mini")
+
+
+def get_llm(llm_name: str = "openai", tools: bool = True):
     """
     This function returns the default llm to work with,
     as selected by the user in the dropdown for models.
@@ -27,44 +98,66 @@ def get_llm(llm_name: str = "openai"):
       1. Explicit llm_name argument
       2. LLM_PROVIDER env variable
       3. Default = OpenAI GPT-4o-mini
+    With `tools=False` the plain chat model is returned so the answer
+    does not pay for the agent's tool-decision step.
     """
     model_name = settings.get("model_name", "gpt-4o-mini")
-    if llm_name == "openai":
-        llm = ChatOpenAI(
-            model=model_name,
-            temperature=settings.get("temperature", 0),
-            api_key=settings.get("openai_api_key"),
-            base_url=settings.get("base_url"),
-            streaming=True
-        )
-        search_tool = DuckDuckGoSearchRun()
-        agent = create_react_agent(
-            tools=[search_tool],
-            model=llm
-        )
-        return agent
-    elif llm_name == "anthropic":
+    if llm_name == "anthropic":
         logger.info("Using Anthropic as the LLM provider")
-        model = ChatAnthropic(
-            model_name="claude-3",
+        llm = _with_shared_pool(ChatAnthropic(
+            model_name=ANTHROPIC_MODEL,
             temperature=0,
             api_key=settings.get("ANTROPIC_API_KEY", ""),
             timeout=60,
             stop=None
-        )
-        return model
+        ))
     else:
-        logger.debug(f"LLM provider {llm_name} not supported, defaulting to OpenAI")
+        if llm_name != "openai":
+            logger.debug(f"LLM provider {llm_name} not supported, defaulting to OpenAI")
         llm = ChatOpenAI(
             model=model_name,
             temperature=settings.get("temperature", 0),
             api_key=settings.get("openai_api_key"),
             base_url=settings.get("base_url"),
-            streaming=True
-        )
-        search_tool = DuckDuckGoSearchRun()
-        agent = create_react_agent(
-            tools=[search_tool],
-            model=llm
+            http_async_client=provider_pools.client("openai"),
+            streaming=True,
+            stream_usage=True
         )
-        return agent
+
+    if not tools:
+        return llm
+
+    search_tool = DuckDuckGoSearchRun()
+    agent = create_react_agent(
+        tools=[search_tool],
+        model=llm
+    )
+    return agent
+
+def get_small_talk_llm(llm_name: str = "openai"):
+    """
+    This function returns a plain, tool-less chat model with a small
+    `max_tokens` budget for answering greetings and small talk without
+    going through the ReAct agent.
+    """
+    max_tokens = settings.get("small_talk_max_tokens", 64)
+    if llm_name == "anthropic":
+        logger.info("Using Anthropic for small talk")
+        return _with_shared_pool(ChatAnthropic(
+            model_name=ANTHROPIC_MODEL,
+            temperature=0,
+            api_key=settings.get("ANTROPIC_API_KEY", ""),
+            max_tokens=max_tokens,
+            timeout=60,
+            stop=None
+        ))
+    return ChatOpenAI(
+        model=settings.get("model_name", "gpt-4o-mini"),
+        temperature=settings.get("temperature", 0),
+        api_key=settings.get("openai_api_key"),
+        base_url=settings.get("base_url"),
+        http_async_client=provider_pools.client("openai"),
+        max_tokens=max_tokens,
+        streaming=True,
+        stream_usage=True
+    )
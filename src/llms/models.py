@@ -11,10 +11,15 @@ DESCRIPTION:
 """
 
 from langchain_core.prompts import ChatPromptTemplate
-from utils.messages import stream_extract_message
+from utils.messages import extract_usage, message_text
+from langchain_core.messages import AIMessageChunk, BaseMessage, ToolMessage
+from langgraph.graph.state import CompiledStateGraph
 from utils.config import setup_logger, settings
-from langchain_openai import ChatOpenAI
+from utils.tracing import TracingCallbackHandler, tracer
+from llms.factory import get_llm, provider_name
 from typing import Any, AsyncGenerator
+from models.api import AgentStepResponse
+from datetime import datetime
 from core.base import LLMBase
 
 logger = setup_logger("openai_llm.log")
@@ -24,25 +29,19 @@ class AIChatCore(LLMBase):
     This implements a general method that interacts with the passed llm models
     flexibly making the application more lightweight.
     """
-    def __init__(self, llm):
+    def __init__(self, llm, system_prompt: str | None = None):
         super().__init__(llm)
+        self.system_prompt = system_prompt
+        # Token usage of every model call made through this instance
+        self.usage: dict[str, int] = {}
+        self.calls: list[dict[str, Any]] = []
 
-    async def generate(self, prompt: str, context: str, **kwargs: Any) -> AsyncGenerator[str, None]:
+    def build_messages(self, prompt: str, context: str) -> list[BaseMessage]:
         """
-        Generate a response from the AI chat model.
-        :param prompt: The input prompt for the chat model.
-        :param context: The chat context to include in the prompt.
-        :param kwargs: Additional parameters for the chat model.
-
-        :return: Stream AI chat model response using AsyncGenerator.
+        Build the chat messages sent to the model for a prompt and its context.
         """
-        if not prompt:
-            logger.error("Empty prompt provided to AI")
-            yield "Invalid prompt."
-            return
-
         user_query = prompt
-        system_prompt = settings.get(
+        system_prompt = self.system_prompt or settings.get(
             "system_prompt",
             """
             You are MediTreat, a supportive and trustworthy medical assistant chatbot. 
@@ -70,31 +69,135 @@ class AIChatCore(LLMBase):
             """
         )
         prompt_template = ChatPromptTemplate.from_template(system_prompt)
-        chain = prompt_template | self.llm
+        return prompt_template.format_messages(context=context, user_query=user_query)
+
+    async def generate(
+        self, prompt: str, context: str, **kwargs: Any
+    ) -> AsyncGenerator[str | AgentStepResponse, None]:
+        """
+        Generate a response from the AI chat model.
+        :param prompt: The input prompt for the chat model.
+        :param context: The chat context to include in the prompt.
+        :param kwargs: Additional parameters for the chat model.
 
-        async for chunk in chain.astream({"context": context, "user_query": user_query}, **kwargs):
-            logger.info(f"Streaming chunk: {chunk}")
-            for message in stream_extract_message(chunk):
-                yield message
+        :return: Stream AI chat model response using AsyncGenerator.
+            Text tokens are yielded as they are produced; when the llm is an
+            agent, tool-call progress is yielded as `AgentStepResponse` events.
+
+        Token usage reported by the model is accumulated in `self.usage`,
+        with one entry per model call (each agent step) in `self.calls`.
+        """
+        if not prompt:
+            logger.error("Empty prompt provided to AI")
+            yield "Invalid prompt."
+            return
+
+        messages = self.build_messages(prompt, context)
+
+        # Not made current: a generator may be resumed from another context.
+        # Model calls and tool runs are attached through the callback handler.
+        span = tracer.start_span("llm.generate", agent=isinstance(self.llm, CompiledStateGraph))
+        if tracer.enabled and "config" not in kwargs:
+            kwargs["config"] = {"callbacks": [TracingCallbackHandler(tracer, span)]}
+        error = None
+        try:
+            if isinstance(self.llm, CompiledStateGraph):
+                async for item in self._stream_agent(messages, **kwargs):
+                    yield item
+                return
+
+            async for chunk in self.llm.astream(messages, **kwargs):
+                logger.debug(f"Streaming chunk: {chunk}")
+                self._add_usage(extract_usage(chunk), "generate")
+                text = message_text(chunk)
+                if text:
+                    yield text
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            span.attributes.update(self.usage)
+            tracer.end_span(span, error=error)
+
+    async def _stream_agent(
+        self, messages: list, **kwargs: Any
+    ) -> AsyncGenerator[str | AgentStepResponse, None]:
+        """
+        Stream an agent run token by token using LangGraph's `messages`
+        stream mode, surfacing tool calls and tool results as agent steps.
+        """
+        async for chunk, metadata in self.llm.astream(
+            {"messages": messages}, stream_mode="messages", **kwargs
+        ):
+            node = metadata.get("langgraph_node")
+            if isinstance(chunk, ToolMessage):
+                yield AgentStepResponse(
+                    step_type="analyzing",
+                    content=f"Reviewing results from {chunk.name or 'tool'}",
+                    timestamp=datetime.now(),
+                    metadata={"tool": chunk.name, "node": node}
+                )
+                continue
+
+            self._add_usage(extract_usage(chunk), "agent_step", step=metadata.get("langgraph_step"))
+            if isinstance(chunk, AIMessageChunk):
+                for tool_call in chunk.tool_call_chunks:
+                    # Arguments arrive in pieces; the name only on the first one
+                    if tool_call.get("name"):
+                        yield AgentStepResponse(
+                            step_type="searching",
+                            content=f"Calling {tool_call['name']}",
+                            timestamp=datetime.now(),
+                            metadata={"tool": tool_call["name"], "node": node}
+                        )
+
+            text = message_text(chunk)
+            if text:
+                yield text
+
+    def _add_usage(
+        self, usage: dict[str, int], call: str, step: int | None = None, provider: str | None = None
+    ) -> None:
+        """
+        Accumulate token usage reported by the model. Providers may report
+        one call's usage over several chunks; those are merged into one entry.
+        `provider` is recorded for calls that do not go to the turn's provider.
+        """
+        if not usage:
+            return
+        for key, value in usage.items():
+            self.usage[key] = self.usage.get(key, 0) + value
+
+        entry = next(
+            (c for c in self.calls if c["call"] == call and c.get("step") == step), None
+        )
+        if entry is None:
+            entry = {"call": call, "step": step} if step is not None else {"call": call}
+            if provider is not None:
+                entry["provider"] = provider
+            self.calls.append(entry)
+        for key, value in usage.items():
+            entry[key] = entry.get(key, 0) + value
 
     async def summarize(self, context: str):
         """Summarize the given context using the loaded prompt."""
         prompt = ChatPromptTemplate.from_template(
             "Summarize the chat history in reported speech in less than 100 words: {history}"
         )
-        llm = ChatOpenAI(
-            model=settings.get("model_name", "gpt-4o-mini"),
-            temperature=settings.get("temperature", 0),
-            api_key=settings.get("openai_api_key"),
-            base_url=settings.get("base_url")
-        )
+        provider = provider_name(settings.get("summary_provider", "") or settings.get("llm_provider", "openai"))
+        llm = get_llm(provider, tools=False)
         if not context.strip():
             logger.warning("Empty context provided for summarization.")
             return "No context available."
         
         chain = prompt | llm
 
-        result = await chain.ainvoke({"history": context})
+        with tracer.span("llm.summarize", context_chars=len(context)):
+            result = await chain.ainvoke({"history": context})
+        # Summaries go to the configured provider, whichever one answers
+        self._add_usage(extract_usage(result), "summarize", provider=provider)
         summary = result.content
 
         logger.info("Context successfully summarized.")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines a lightweight local intent classifier that sits
+    in front of the chat model. Greetings, thanks and acknowledgements
+    are routed to a canned reply or a small tool-less model call instead
+    of the full ReAct agent with web search and history retrieval.
+"""
+
+from memory.compression import strip_boilerplate
+from utils.metrics import metrics
+from dataclasses import dataclass
+from utils.types import Route
+from typing import Any, Dict, Optional
+import math
+import re
+
+# Messages that are nothing but a greeting/thanks/acknowledgement.
+_CANNED_PATTERNS: Dict[str, re.Pattern] = {
+    "greeting": re.compile(
+        r"^(hi+|hello+|hey+|hiya|howdy|yo|good (morning|afternoon|evening)|greetings)"
+        r"( there| meditreat)?[\s!.,]*$",
+        re.IGNORECASE,
+    ),
+    "thanks": re.compile(
+        r"^(thanks?( you)?( so much| a lot| very much)?|thank u|thx|ty|cheers|much appreciated)"
+        r"[\s!.,]*$",
+        re.IGNORECASE,
+    ),
+    "acknowledgement": re.compile(
+        r"^(ok+(ay)?|k|alright|all right|got it|sure|cool|great|nice|noted|understood|"
+        r"i see|makes sense|perfect)[\s!.,]*$",
+        re.IGNORECASE,
+    ),
+    "farewell": re.compile(
+        r"^(bye+|goodbye|see (you|ya)( later)?|good ?night|take care|later)[\s!.,]*$",
+        re.IGNORECASE,
+    ),
+}
+
+# Canned intents that may be answering the assistant ("sure" to "Would you
+# like dosage details?"); these get a canned reply only when the last
+# answer did not ask anything.
+CONTEXT_DEPENDENT_LABELS = frozenset({"acknowledgement", "farewell"})
+
+CANNED_REPLIES: Dict[str, str] = {
+    "greeting": "Hello! I'm MediTreat. How can I help you with your health questions today?",
+    "thanks": "You're welcome! Let me know if there is anything else I can help with.",
+    "acknowledgement": "Great! Feel free to ask if you have any other questions.",
+    "farewell": "Take care! Come back anytime you have a health question.",
+}
+
+# Precomputed log-odds weights of a small lexical model (small talk vs. a
+# medical/information question). Positive weights favour small talk.
+_LEXICAL_WEIGHTS: Dict[str, float] = {
+    "hi": 2.2, "hello": 2.2, "hey": 2.0, "thanks": 2.4, "thank": 2.3, "you": 0.3,
+    "ok": 1.8, "okay": 1.8, "great": 1.2, "cool": 1.4, "nice": 1.2, "bye": 2.2,
+    "morning": 1.1, "evening": 1.1, "night": 0.8, "how": 0.2, "are": 0.4,
+    "doing": 0.9, "good": 0.8, "well": 0.3, "name": 0.9, "who": 0.6, "meditreat": 1.0,
+    "appreciate": 1.6, "helpful": 1.3, "awesome": 1.4, "lol": 1.5, "haha": 1.5,
+    "pain": -2.5, "ache": -2.3, "fever": -2.6, "cough": -2.4, "symptom": -2.6,
+    "symptoms": -2.6, "dose": -2.6, "dosage": -2.7, "mg": -2.5, "medicine": -2.4,
+    "medication": -2.5, "drug": -2.4, "pill": -2.2, "treatment": -2.5, "treat": -2.0,
+    "side": -1.2, "effects": -1.6, "blood": -2.2, "pressure": -1.5, "diabetes": -2.7,
+    "infection": -2.6, "rash": -2.5, "headache": -2.6, "sick": -2.0, "hurt": -2.0,
+    "hurts": -2.1, "bleeding": -2.8, "breathing": -2.4, "chest": -2.3, "pregnant": -2.6,
+    "doctor": -1.4, "hospital": -1.8, "what": -0.8, "why": -1.0, "should": -1.0,
+    "can": -0.5, "is": -0.3, "latest": -1.2, "news": -1.2, "research": -1.8,
+}
+# Words a small-talk message may contain besides the positive-weight ones.
+# Any other word (a symptom, a drug, "overdosed", "fainted"...) rules small
+# talk out, since the small-talk path has no history and gives no medical
+# information.
+_FUNCTION_WORDS = frozenset({
+    "i", "im", "i'm", "me", "my", "a", "an", "the", "am", "is", "are", "it", "it's",
+    "so", "very", "much", "too", "and", "there", "your", "you're", "u", "up", "today",
+    "what", "what's", "whats", "how", "how's", "hows", "its", "just", "all", "for",
+    "again", "really", "oh", "ah", "wow", "yes", "yeah", "no", "nope", "please", "help",
+})
+_SMALL_TALK_VOCABULARY = _FUNCTION_WORDS | {
+    token for token, weight in _LEXICAL_WEIGHTS.items() if weight > 0
+}
+_LEXICAL_BIAS = -0.6
+_LENGTH_PENALTY = 0.35  # per token beyond the first few, small talk is short
+_TOKEN_RE = re.compile(r"[a-z']+")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Words suggesting the answer depends on information newer than the model.
+_RECENCY_RE = re.compile(
+    r"\b(latest|newest|recent(ly)?|current(ly)?|today|this (week|month|year)|news|"
+    r"update[sd]?|new (drug|treatment|study|studies|guideline|guidelines|vaccine)|"
+    r"approved|approval|fda|recall(ed)?|outbreak|shortage|20[2-9][0-9])\b",
+    re.IGNORECASE,
+)
+# Common drug names and generic-name suffixes (monoclonals, kinase inhibitors,
+# ACE inhibitors, sartans, statins, beta blockers, antifungals, antibiotics...).
+_DRUG_NAMES = frozenset({
+    "paracetamol", "acetaminophen", "ibuprofen", "aspirin", "naproxen", "metformin",
+    "insulin", "ozempic", "wegovy", "semaglutide", "tirzepatide", "amoxicillin",
+    "warfarin", "heparin", "prednisone", "omeprazole", "sertraline", "fluoxetine",
+    "tramadol", "codeine", "morphine", "diclofenac", "cetirizine", "loratadine",
+})
+_DRUG_SUFFIX_RE = re.compile(
+    r"[a-z]{3,}(mab|nib|pril|sartan|statin|olol|azole|cillin|mycin|cycline|floxacin|"
+    r"vir|tide|gliflozin|gliptin|dipine|prazole|setron|triptan|parin)$"
+)
+
+
+@dataclass(frozen=True)
+class SearchDecision:
+    """Whether a query should go through the web-search agent, and why."""
+    use_search: bool
+    reason: str
+
+
+@dataclass(frozen=True)
+class IntentResult:
+    """Outcome of classifying a single user message."""
+    route: Route
+    label: str
+    confidence: float
+
+
+def small_talk_score(message: str) -> float:
+    """
+    Return the probability that the message is small talk. Messages with
+    a word outside the small-talk vocabulary score 0, however friendly
+    the rest is ("hey my son fainted").
+    """
+    tokens = _TOKEN_RE.findall(message.lower())
+    if not tokens or any(token not in _SMALL_TALK_VOCABULARY for token in tokens):
+        return 0.0
+    logit = _LEXICAL_BIAS + sum(_LEXICAL_WEIGHTS.get(token, 0.0) for token in tokens)
+    logit -= _LENGTH_PENALTY * max(0, len(tokens) - 4)
+    return 1 / (1 + math.exp(-logit))
+
+
+def classify_intent(message: str, threshold: float = 0.8) -> IntentResult:
+    """
+    Classify a user message into a route.
+    Exact greetings/thanks/acknowledgements get a canned reply, messages the
+    lexical model is confident are small talk get a tool-less model call and
+    everything else goes to the agent path (see `needs_search` for whether
+    the search tool is actually worth it).
+    """
+    text = message.strip()
+    for label, pattern in _CANNED_PATTERNS.items():
+        if pattern.match(text):
+            return IntentResult(route=Route.CANNED, label=label, confidence=1.0)
+
+    score = small_talk_score(text)
+    if score >= threshold:
+        return IntentResult(route=Route.SMALL_TALK, label="small_talk", confidence=score)
+    return IntentResult(route=Route.AGENT, label="question", confidence=1 - score)
+
+
+def needs_search(message: str, enable_search: bool | None = None) -> SearchDecision:
+    """
+    Decide whether a query is worth the latency of the web-search agent.
+    An explicit `enable_search` from the client wins; otherwise queries
+    asking about recent information or naming a drug go to the agent and
+    everything else is answered directly by the plain chat model.
+    """
+    if enable_search is not None:
+        return SearchDecision(use_search=enable_search, reason="explicit")
+    if _RECENCY_RE.search(message):
+        return SearchDecision(use_search=True, reason="recency")
+    for token in _TOKEN_RE.findall(message.lower()):
+        if token in _DRUG_NAMES or _DRUG_SUFFIX_RE.match(token):
+            return SearchDecision(use_search=True, reason="drug_name")
+    return SearchDecision(use_search=False, reason="default")
+
+
+def needs_last_reply(intent: IntentResult) -> bool:
+    """Whether a canned intent depends on what the assistant said last."""
+    return intent.route is Route.CANNED and intent.label in CONTEXT_DEPENDENT_LABELS
+
+
+def asks_question(reply: str) -> bool:
+    """Whether an assistant answer, disclaimer aside, ends by asking the user something."""
+    sentences = _SENTENCE_END_RE.split(strip_boilerplate(reply).strip())
+    return any(sentence.rstrip(" *_)\"'").endswith("?") for sentence in sentences[-2:])
+
+
+def canned_reply(intent: IntentResult) -> str:
+    """Return the canned reply for a canned intent."""
+    return CANNED_REPLIES.get(intent.label, CANNED_REPLIES["acknowledgement"])
+
+
+def record_route(route: Route, latency_ms: float) -> None:
+    """Record which route a message took and how long the turn took."""
+    metrics.incr("chat.route", route=route.value)
+    metrics.observe("chat.turn_latency_ms", latency_ms, route=route.value)
+
+
+def _baseline(route: Route, latencies: Dict[Route, Dict[str, float]]) -> tuple[Optional[str], float]:
+    """
+    The path a route's messages would take without it, and that path's mean
+    latency. Canned and small-talk messages would otherwise get a full answer
+    (direct or agent); direct answers would otherwise go through the agent.
+    """
+    if route in (Route.CANNED, Route.SMALL_TALK):
+        full = [latencies[other] for other in (Route.DIRECT, Route.AGENT) if latencies[other]["count"]]
+        count = sum(latency["count"] for latency in full)
+        if count:
+            return "non_small_talk", sum(latency["mean"] * latency["count"] for latency in full) / count
+    elif route is Route.DIRECT and latencies[Route.AGENT]["count"]:
+        return Route.AGENT.value, latencies[Route.AGENT]["mean"]
+    return None, 0.0
+
+
+def routing_report() -> Dict[str, Dict[str, Any]]:
+    """
+    Report the share of traffic taken by each route and the latency saved
+    compared with the path its messages would otherwise take. Routes with
+    no measured baseline report no saving.
+    """
+    counts = {route: metrics.counter("chat.route", route=route.value) for route in Route}
+    total = sum(counts.values())
+    latencies = {route: metrics.summary("chat.turn_latency_ms", route=route.value) for route in Route}
+
+    report = {}
+    for route, count in counts.items():
+        baseline, baseline_mean = _baseline(route, latencies)
+        saved = 0.0
+        if baseline is not None:
+            saved = max(0.0, baseline_mean - latencies[route]["mean"]) * count
+        report[route.value] = {
+            "count": count,
+            "share": count / total if total else 0.0,
+            "mean_latency_ms": latencies[route]["mean"],
+            "baseline": baseline,
+            "baseline_latency_ms": baseline_mean,
+            "latency_saved_ms": saved,
+        }
+    return report
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the shared HTTP transport of the LLM providers.
+    One pooled `httpx.AsyncClient` (HTTP/2 when enabled) is kept per
+    provider endpoint and injected into every chat model, so TCP and TLS
+    handshakes happen at startup and on idle pings instead of on a
+    user's turn. Connection reuse and handshakes are counted through the
+    httpx `trace` extension.
+"""
+
+from utils.config import setup_logger, settings
+from typing import Any, Dict, Optional
+from utils.metrics import metrics
+from urllib.parse import urlsplit
+import asyncio
+import httpx
+import time
+
+logger = setup_logger("transport.log")
+
+DEFAULT_ENDPOINTS = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com",
+}
+
+
+def provider_endpoint(provider: str) -> str:
+    """The base URL a provider's models send requests to."""
+    if provider == "anthropic":
+        return DEFAULT_ENDPOINTS["anthropic"]
+    return settings.get("base_url") or DEFAULT_ENDPOINTS["openai"]
+
+
+def _host(endpoint: str) -> str:
+    return urlsplit(endpoint).netloc
+
+
+class ProviderPools:
+    """
+    Process-wide connection pools, one per provider endpoint. Pools exist
+    only between `start` and `close`, which the application lifespan calls
+    on its event loop; outside of it models fall back to their own clients.
+    """
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._last_used: Dict[str, float] = {}
+
+    @property
+    def started(self) -> bool:
+        return bool(self._clients)
+
+    def _create_client(self, endpoint: str) -> httpx.AsyncClient:
+        host = _host(endpoint)
+        return httpx.AsyncClient(
+            http2=settings.get("http2", True),
+            limits=httpx.Limits(
+                max_connections=settings.get("http_max_connections", 100),
+                max_keepalive_connections=settings.get("http_max_keepalive", 20),
+                keepalive_expiry=settings.get("http_keepalive_expiry", 120.0)
+            ),
+            timeout=httpx.Timeout(
+                settings.get("http_timeout", 60.0),
+                connect=settings.get("http_connect_timeout", 5.0)
+            ),
+            event_hooks={
+                "request": [lambda request: self._on_request(host, request)],
+                "response": [lambda response: self._on_response(host, response)],
+            }
+        )
+
+    async def _on_request(self, host: str, request: httpx.Request) -> None:
+        # Connection events are reported per request; a request that never
+        # opens a connection was sent over a pooled one
+        state: Dict[str, float] = {}
+        request.extensions["meditreat.connection"] = state
+
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.started":
+                state["connected"] = time.perf_counter()
+            elif event == "connection.start_tls.complete":
+                metrics.incr("http.tls_handshakes", host=host)
+                metrics.observe("http.handshake_ms", (time.perf_counter() - state["connected"]) * 1000, host=host)
+
+        request.extensions["trace"] = trace
+
+    async def _on_response(self, host: str, response: httpx.Response) -> None:
+        state = response.request.extensions.get("meditreat.connection", {})
+        metrics.incr("http.requests", host=host)
+        if "connected" in state:
+            metrics.incr("http.connections_opened", host=host)
+        else:
+            metrics.incr("http.connections_reused", host=host)
+        self._last_used[host] = time.monotonic()
+
+    async def start(self, providers: tuple[str, ...] = ("openai",)) -> None:
+        """Open a pool per provider endpoint and warm it."""
+        for provider in providers:
+            endpoint = provider_endpoint(provider)
+            if endpoint not in self._clients:
+                self._clients[endpoint] = self._create_client(endpoint)
+        await self.warm(settings.get("http_warm_connections", 2))
+
+    def client(self, provider: str) -> Optional[httpx.AsyncClient]:
+        """The shared client for a provider, or None when pools are not started."""
+        return self._clients.get(provider_endpoint(provider))
+
+    async def _ping(self, endpoint: str, client: httpx.AsyncClient) -> None:
+        try:
+            # Any response keeps the connection open; the status is irrelevant
+            await client.head(endpoint)
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to reach {endpoint}: {e}")
+
+    async def warm(self, connections: int = 2) -> None:
+        """Open up to `connections` connections per endpoint ahead of traffic."""
+        await asyncio.gather(*(
+            self._ping(endpoint, client)
+            for endpoint, client in self._clients.items()
+            for _ in range(max(1, connections))
+        ))
+        logger.info(f"Warmed HTTP pools for {', '.join(self._clients)}")
+
+    async def keepalive(self, interval: float) -> None:
+        """Ping endpoints left idle for `interval` seconds so their connections stay open."""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for endpoint, client in list(self._clients.items()):
+                if now - self._last_used.get(_host(endpoint), 0.0) >= interval:
+                    await self._ping(endpoint, client)
+
+    async def close(self) -> None:
+        """Close every pool."""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Requests, connections opened, TLS handshakes and reuse ratio per host."""
+        report = {}
+        for endpoint in self._clients:
+            host = _host(endpoint)
+            requests = metrics.counter("http.requests", host=host)
+            reused = metrics.counter("http.connections_reused", host=host)
+            report[host] = {
+                "requests": requests,
+                "connections_opened": metrics.counter("http.connections_opened", host=host),
+                "tls_handshakes": metrics.counter("http.tls_handshakes", host=host),
+                "reuse_ratio": round(reused / requests, 4) if requests else 0.0,
+            }
+        return report
+
+
+provider_pools = ProviderPools()
@@ -9,18 +9,37 @@ DESCRIPTION:
     interaction with the selected LLM.
 """
 
-from fastapi import FastAPI, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response, status, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from utils.profiling import ProfilerBusyError, profiler
 from utils.config import setup_logger, setup_async_logger
+from memory.streams import StreamGapError, stream_registry
 from fastapi.middleware.cors import CORSMiddleware
-from memory.supabase import SupabaseMemoryManager
-from fastapi.responses import JSONResponse
-from contextlib import asynccontextmanager
-from models.supabase import MessageRecord
-from llms.models import AIChatCore
+from fastapi.middleware.gzip import GZipMiddleware
+from uvicorn.protocols.utils import ClientDisconnected
+from memory.retention import RetentionBusyError, RetentionPolicy, retention_loop, submit_retention_job
+from core.connections import CLOSE_SERVICE_RESTART, ConnectionLimitError, Session, connections
+from core.engine import ChatTurn, ChatTurnEngine
+from core.jobs import Job, jobs
+from contextlib import asynccontextmanager, aclosing
+from typing import Any, AsyncGenerator, Callable, Optional
+from llms.router import routing_report
+from llms.transport import provider_pools
+from llms.factory import check_shared_pools
+from utils.metrics import metrics
+from utils.offload import cpu_pool
+from utils.tracing import tracer
 from utils.config import settings
-from llms.factory import get_llm
-from utils.types import Sender
+from datetime import datetime
+import secrets
+import asyncio
+import json
+import uuid
 from models.api import (
+    ChatResponse,
+    ResumeInput,
+    StreamingChatInput,
     UserInput
 )
 
@@ -28,6 +47,90 @@ logger = setup_logger("main.log")
 
 allowed_origins = settings.get("allowed_origins", "*").split(",")
 
+engine = ChatTurnEngine(logger)
+
+def _is_disconnect(error: BaseException | None) -> bool:
+    """Whether a send failed because the client has gone away."""
+    return isinstance(error, (WebSocketDisconnect, ClientDisconnected))
+
+async def _relay_stream(session: Session, frames: AsyncGenerator[str, None]) -> None:
+    """
+    Send the frames of a stream to a client, from the resumed offset
+    onwards and then the live continuation until the turn is finished.
+    """
+    async with aclosing(frames):
+        async for frame in frames:
+            await connections.send_text(session, frame)
+
+async def _relay_until_disconnect(session: Session, frames: AsyncGenerator[str, None]) -> bool:
+    """
+    Relay a stream to a WebSocket client while watching for a disconnect.
+    Returns False if the client went away before the stream was finished.
+    """
+    relay = asyncio.create_task(_relay_stream(session, frames))
+    disconnect = asyncio.create_task(connections.wait_for_disconnect(session))
+    await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+
+    if relay.done() and relay.exception() is None:
+        disconnect.cancel()
+        return True
+    if not disconnect.done() and not _is_disconnect(relay.exception()):
+        disconnect.cancel()
+        raise relay.exception()
+    relay.cancel()
+    disconnect.cancel()
+    return False
+
+def _require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """Allow a request only with the configured admin token."""
+    admin_token = settings.get("admin_token", "")
+    if not admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+def _sse_event(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Format a Server-Sent Event; multi-line data is split across data lines."""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+def _frame_to_sse(frame: str, offset: int) -> str:
+    """Translate a stream frame into its Server-Sent Event."""
+    if frame == "[DONE]":
+        return _sse_event(frame, event="done", event_id=offset)
+    if frame.startswith("[STEP] "):
+        return _sse_event(frame[len("[STEP] "):], event="step", event_id=offset)
+    if frame.startswith("[ERROR] "):
+        return _sse_event(frame[len("[ERROR] "):], event="error", event_id=offset)
+    return _sse_event(frame, event_id=offset)
+
+class TurnEventStream(StreamingResponse):
+    """
+    Event stream of a chat turn. However the response ends, including a
+    client that disconnects before the first event is produced, the event
+    generator is closed and `on_close` wraps the turn up.
+    """
+    def __init__(self, content: AsyncGenerator[str, None], on_close: Callable[[], None], **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self._events = content
+        self._on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+            try:
+                # Detach from the stream buffer so the turn is seen as unread
+                await self._events.aclose()
+            except BaseException as e:
+                logger.debug(f"Event stream closed with error: {e!r}")
+
 @asynccontextmanager
 async def lifespan(
     app: FastAPI
@@ -39,7 +142,39 @@ async def lifespan(
         app.state.logger = await setup_async_logger("main.log")
         app.state.logger.info("Application startup: Logger initialized")
 
+        retention = None
+        policy = RetentionPolicy.from_settings()
+        if policy.enabled:
+            retention = asyncio.create_task(retention_loop(lambda: engine.memory, policy))
+            app.state.logger.info(f"Archiving messages older than {policy.days} days")
+
+        usage_flush = asyncio.create_task(engine.usage.run(settings.get("usage_flush_interval", 30.0)))
+
+        # Open provider connections before the first turn needs them
+        providers = tuple(p.strip() for p in settings.get("http_pool_providers", "openai").split(",") if p.strip())
+        await provider_pools.start(providers)
+        check_shared_pools()
+        keepalive = asyncio.create_task(provider_pools.keepalive(settings.get("http_ping_interval", 60.0)))
+
+        # Spawn this worker's process pool and warm its clients, models and caches
+        await cpu_pool.start()
+        await engine.warm()
+
         yield
+
+        # Let in-flight turns finish and persist before shared clients close
+        await connections.drain()
+        await engine.drain(settings.get("ws_drain_timeout", 25.0))
+
+        keepalive.cancel()
+        await provider_pools.close()
+        await cpu_pool.close()
+        usage_flush.cancel()
+        await engine.usage.flush()
+        if retention is not None:
+            retention.cancel()
+        # Export spans still waiting for the next flush
+        await asyncio.to_thread(tracer.flush)
     except Exception as e:
         if hasattr(app.state, 'logger'):
             app.state.logger.error(f"Error during application lifespan: {e}")
@@ -56,6 +191,9 @@ app = FastAPI(
     redoc_url=None
 )
 
+# Compress JSON responses; event streams are excluded by the middleware
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Set up CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -73,84 +211,53 @@ async def chat(
     This endpoint handles user chat input and returns
     a response from the selected LLM with persistent memory.
     """
-    await websocket.accept()
     try:
-        raw = await websocket.receive_json()
+        session = await connections.connect(websocket, "chat")
+    except ConnectionLimitError as e:
+        logger.warning(f"Refused /ws/chat session: {e}")
+        return
+    try:
+        raw = await connections.receive_json(session)
         user_input = UserInput.model_validate(raw)
-        # Validate user input
-        if not user_input.user_id or not user_input.message:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="user_id and message are required fields."
-            )
         logger.info(f"Received message from user {user_input.user_id}")
 
-        if user_input.llm is None:
-            user_input.llm = "openai"
-
-        # Get the LLM based on user preference
-        llm = get_llm(user_input.llm)
+        turn = await engine.start(user_input)
+        session.turn = turn
 
-        # model
-        model = AIChatCore(llm=llm)
-
-        # Save messages to Supabase
-        supabase_manager = SupabaseMemoryManager(logger)
-
-        context = await supabase_manager.get_conversation_history(
-            user_id=user_input.user_id,
-            chat_id=user_input.chat_id
-        )
+        # Frames go through a replay buffer so a client that loses the socket
+        # can resume from /ws/chat/resume with the stream ID and its offset
+        await connections.send_text(session, f"[STREAM] {turn.stream.stream_id}")
 
-        logger.debug(f"Retrieved context: {context}")
-
-        context_str = "\n".join([f"{record.sender}: {record.message}" for record in context])
-        context_summary = await model.summarize(context_str)
-
-        logger.info(f"Context summary generated: {context_summary}")
-        ai_tokens = []
-        async for token in model.generate(user_input.message, context_str):
-            await websocket.send_text(token)
-            ai_tokens.append(token)
-        ai_message_str = ''.join(ai_tokens)
-        await websocket.send_text("[DONE]")
-        logger.info(f"Completed response for user {user_input.user_id}")
-
-        # Save user message
-        user_message = MessageRecord(
-            user_id=user_input.user_id,
-            chat_id=user_input.chat_id,
-            sender=Sender.USER,
-            message=user_input.message,
-            meta={
-            "chat_id": user_input.chat_id,
-            "llm_provider": user_input.llm,
-            "temperature": user_input.temperature,
-            "username": user_input.username
-            }
-        )
+        # Watch for a disconnect while generating so the upstream stream and
+        # any in-flight tool call are cancelled instead of running to completion
+        try:
+            connected = await _relay_until_disconnect(session, turn.stream.follow(0))
+        except ConnectionLimitError:
+            # Keep what was generated within the session's budget
+            await engine.truncate(turn)
+            await engine.finish(turn)
+            raise
+        except Exception:
+            turn.generation.cancel()
+            raise
+        if not connected:
+            if session.close_code == CLOSE_SERVICE_RESTART or connections.draining:
+                # The server is shutting down, so the answer cannot be resumed here
+                await engine.wind_down(turn, connections.drain_timeout)
+            else:
+                await engine.abandon(turn)
 
-        # Save AI response
-        ai_message = MessageRecord(
-            user_id=user_input.user_id,
-            chat_id=user_input.chat_id,
-            sender=Sender.SYSTEM,
-            message=ai_message_str,
-            meta={
-            "chat_id": user_input.chat_id,
-            "llm_provider": user_input.llm,
-            "temperature": user_input.temperature
-            }
-        )
+        # Errors have already been relayed to the client as an [ERROR] frame
+        await engine.finish(turn)
 
-        # Persist to Supabase asynchronously
+    except ConnectionLimitError as e:
+        logger.warning(f"Closing /ws/chat session: {e}")
         try:
-            await supabase_manager.add_message_record(user_message)
-            await supabase_manager.add_message_record(ai_message)
-            logger.info("Messages persisted to Supabase successfully")
-        except Exception as e:
-            logger.error(f"Failed to persist messages to Supabase: {e}")
-    
+            await websocket.send_text(f"[ERROR] {e}")
+        except Exception:
+            pass
+        await connections.close(session, e.code, str(e))
+
     except WebSocketDisconnect as we:
         logger.error(f"Error to work with websocket: {we}")
 
@@ -162,6 +269,142 @@ async def chat(
         except Exception:
             pass
 
+    finally:
+        connections.disconnect(session)
+
+@app.websocket("/ws/chat/resume")
+async def resume_chat(
+    websocket: WebSocket
+):
+    """
+    This endpoint resumes a streamed answer after a reconnect. The client
+    sends the stream ID from the [STREAM] frame and the number of frames it
+    has already received, gets the missing tail and then the live rest.
+    """
+    try:
+        session = await connections.connect(websocket, "resume")
+    except ConnectionLimitError as e:
+        logger.warning(f"Refused /ws/chat/resume session: {e}")
+        return
+    try:
+        raw = await connections.receive_json(session)
+        resume = ResumeInput.model_validate(raw)
+        stream = stream_registry.get(resume.stream_id)
+        if stream is not None:
+            frames = stream.follow(resume.offset)
+        else:
+            # Another worker of this instance owns the stream
+            frames = stream_registry.follow_spooled(resume.stream_id, resume.offset)
+        if frames is None:
+            owner = stream_registry.owner(resume.stream_id)
+            if owner != stream_registry.instance_id:
+                await websocket.send_text(
+                    f"[ERROR] Stream {resume.stream_id} is owned by instance {owner}; "
+                    f"route the resume there with ?instance={owner}"
+                )
+            else:
+                await websocket.send_text(f"[ERROR] Stream {resume.stream_id} has expired")
+            return
+
+        metrics.incr("chat.stream_resumes", spooled=str(stream is None).lower())
+        await _relay_until_disconnect(session, frames)
+
+    except ConnectionLimitError as e:
+        logger.warning(f"Closing /ws/chat/resume session: {e}")
+        await connections.close(session, e.code, str(e))
+
+    except WebSocketDisconnect as we:
+        logger.error(f"Error to work with websocket: {we}")
+
+    except StreamGapError as e:
+        logger.warning(f"Cannot resume stream: {e}")
+        await websocket.send_text(f"[ERROR] {e}")
+
+    except Exception as e:
+        logger.error(f"Error in /ws/chat/resume endpoint: {e}")
+        try:
+            await websocket.send_text(f"[ERROR] {e}")
+        except Exception:
+            pass
+
+    finally:
+        connections.disconnect(session)
+
+async def _start_http_turn(chat_input: StreamingChatInput, resumable: bool) -> ChatTurn:
+    """Start a chat turn for an HTTP request, mapping input errors to 400."""
+    try:
+        return await engine.start(chat_input.to_user_input(), resumable=resumable)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting chat turn: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@app.post("/chat/stream")
+async def chat_stream(
+    chat_input: StreamingChatInput
+):
+    """
+    This endpoint streams the answer as Server-Sent Events, for clients
+    behind proxies that handle WebSockets poorly. The first event carries
+    the stream ID and chat ID; tokens are plain `data` events followed by
+    `step`, `error` and `done` events as on the WebSocket.
+    """
+    turn = await _start_http_turn(chat_input, resumable=True)
+    finished = False
+
+    async def events() -> AsyncGenerator[str, None]:
+        nonlocal finished
+        yield _sse_event(
+            json.dumps({
+                "stream_id": turn.stream.stream_id,
+                "chat_id": turn.user_input.chat_id,
+                "trace_id": turn.span.trace_id
+            }),
+            event="stream"
+        )
+        offset = 0
+        async with aclosing(turn.stream.follow(0)) as frames:
+            async for frame in frames:
+                yield _frame_to_sse(frame, offset)
+                offset += 1
+        finished = True
+
+    return TurnEventStream(
+        events(),
+        # A disconnect cancels the response, so the turn is wrapped up from
+        # a task of its own rather than awaited here
+        on_close=lambda: engine.finish_in_background(turn, abandoned=not finished),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "X-Trace-Id": turn.span.trace_id
+        }
+    )
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_once(
+    chat_input: StreamingChatInput,
+    response: Response
+):
+    """
+    This endpoint answers a chat message in a single JSON response
+    for server-to-server callers.
+    """
+    turn = await _start_http_turn(chat_input, resumable=False)
+    response.headers["X-Trace-Id"] = turn.span.trace_id
+    error = await engine.finish(turn)
+    if error is not None:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(error))
+
+    return ChatResponse(
+        message=turn.message,
+        user_id=turn.user_input.user_id,
+        chat_id=turn.user_input.chat_id,
+        timestamp=datetime.now()
+    )
+
 # TODO: Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -170,6 +413,113 @@ async def health_check():
     """
     return JSONResponse(content={"status": "ok"}, status_code=status.HTTP_200_OK)
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    This endpoint reports in-process metrics, including the share of
+    traffic taken by each chat route and the latency it saved.
+    """
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "routing": routing_report(),
+            "streams": stream_registry.stats(),
+            "http_pools": provider_pools.stats(),
+            "connections": connections.stats(),
+            **metrics.snapshot()
+        }
+    )
+
+@app.delete("/chats/{chat_id}", dependencies=[Depends(_require_admin)], status_code=status.HTTP_202_ACCEPTED)
+async def delete_chat(
+    chat_id: str,
+    user_id: str = Query(...)
+):
+    """
+    This endpoint deletes a chat's messages in the background, in bounded
+    chunks on the indexed user_id/chat_id columns. Poll /jobs/{id} for progress.
+    Requires the X-Admin-Token header until requests carry a verified user.
+    """
+    try:
+        user_id, chat_id = str(uuid.UUID(user_id)), str(uuid.UUID(chat_id))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="user_id and chat_id must be UUIDs.")
+
+    memory = engine.memory
+
+    async def run(job: Job) -> None:
+        job.progress(0, await memory.count_messages(user_id=user_id, chat_id=chat_id))
+        await memory.delete_messages(on_progress=job.progress, user_id=user_id, chat_id=chat_id)
+
+    job = jobs.submit("delete_chat", run, user_id=user_id, chat_id=chat_id)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.to_dict())
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str
+):
+    """
+    This endpoint reports the progress of a background job.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job {job_id} not found")
+    return JSONResponse(status_code=status.HTTP_200_OK, content=job.to_dict())
+
+@app.get("/admin/usage", dependencies=[Depends(_require_admin)])
+async def usage_report(
+    group_by: str = Query(default="day", pattern=r"^(user|day|provider)(,(user|day|provider))*$"),
+    user_id: Optional[str] = None,
+    start: Optional[str] = Query(default=None, description="First day, YYYY-MM-DD"),
+    end: Optional[str] = Query(default=None, description="Last day, YYYY-MM-DD")
+):
+    """
+    This endpoint reports turns, tokens and estimated cost grouped by any
+    of user, day and provider, read from incremental rollups rather than
+    the messages table. Requires the X-Admin-Token header.
+    """
+    try:
+        rows = await engine.usage.report(group_by.split(","), user_id=user_id, start=start, end=end)
+    except Exception as e:
+        logger.error(f"Error building usage report: {e}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"group_by": group_by, "rows": rows})
+
+@app.post("/admin/retention", dependencies=[Depends(_require_admin)], status_code=status.HTTP_202_ACCEPTED)
+async def run_retention():
+    """
+    This endpoint starts an archival run of the retention policy now.
+    Requires the X-Admin-Token header.
+    """
+    policy = RetentionPolicy.from_settings()
+    if not policy.enabled:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Retention is disabled (RETENTION_DAYS=0)")
+    try:
+        job = submit_retention_job(engine.memory, policy)
+    except RetentionBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.to_dict())
+
+@app.post("/admin/profile", dependencies=[Depends(_require_admin)])
+async def profile_cpu(
+    seconds: float = Query(default=10.0, gt=0)
+):
+    """
+    This endpoint samples the stacks of every thread for the given number
+    of seconds and returns them as folded stacks, ready for flamegraph.pl
+    or speedscope. Requires the X-Admin-Token header.
+    """
+    seconds = min(seconds, settings.get("profile_max_seconds", 60.0))
+    try:
+        result = await asyncio.to_thread(profiler.profile, seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    return PlainTextResponse(
+        content=result["folded"],
+        headers={"X-Profile-Samples": str(result["samples"])}
+    )
+
 @app.get("/")
 async def root():
     """This endpoint is the root endpoint of the API.
@@ -179,6 +529,6 @@ async def root():
         content={
             "welcome": "Welcome, to Meditreat, your best medical consultant.",
             "version": "0.1.0",
-            "endpoints": "[/, health, ws/*]"
+            "endpoints": "[/, health, metrics, chat, chat/stream, ws/*, chats, jobs, admin/*]"
         }
     )
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module compresses conversation history before it is sent to the
+    model. Known boilerplate such as the medical disclaimer every answer
+    ends with is stripped, near-duplicate turns are collapsed and long
+    assistant answers are abbreviated to extractive snippets. The
+    compressed form of each stored message is memoized, as a message
+    never changes once stored.
+"""
+
+from models.supabase import MessageBatch
+from utils.config import settings
+from dataclasses import dataclass
+from functools import lru_cache
+from collections import Counter
+from utils.types import Sender
+from typing import Dict, List
+import re
+
+# Boilerplate the system prompt asks the model to append (rule 3 of
+# base_system_prompt.txt). Sentences are matched separately since answers
+# often paraphrase or reorder them.
+BOILERPLATE_PATTERNS = [
+    r"(?:\*\*|\*|_)?(?:disclaimer:\s*)?(?:\*\*|\*|_)?\s*I[’']?m not a doctor\.?",
+    r"This information is for educational purposes only\.?",
+    r"Please consult (?:a|with a) (?:licensed |qualified )?(?:healthcare|medical) (?:professional|provider)"
+    r"(?: for (?:medical advice|personalized advice|proper diagnosis and treatment))?\.?",
+]
+_BOILERPLATE_RE = re.compile(
+    r"(?:\s*(?:" + "|".join(BOILERPLATE_PATTERNS) + r")(?:\*\*|\*|_)?)+\s*$",
+    re.IGNORECASE
+)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have i if in is it its of on or so "
+    "that the their this to was what when which will with you your".split()
+)
+
+
+@dataclass(frozen=True)
+class CompressedContext:
+    """A compressed transcript and its size before and after, in estimated tokens."""
+    text: str
+    tokens: int
+    compressed_tokens: int
+    dropped_turns: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.tokens - self.compressed_tokens
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of English text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def strip_boilerplate(text: str) -> str:
+    """Remove the trailing disclaimer and similar boilerplate from an answer."""
+    return _BOILERPLATE_RE.sub("", text).rstrip()
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def extractive_snippet(text: str, max_words: int) -> str:
+    """
+    Abbreviate text to its most central sentences, up to about `max_words`
+    words, kept in their original order. Sentences are scored by how
+    frequent their content words are across the text; the first sentence,
+    which usually answers the question, always stays.
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+    if len(text.split()) <= max_words or len(sentences) < 2:
+        return text
+
+    frequencies = Counter(word for word in _words(text) if word not in _STOPWORDS)
+    def score(sentence: str) -> float:
+        words = [word for word in _words(sentence) if word not in _STOPWORDS]
+        return sum(frequencies[word] for word in words) / (len(words) or 1)
+
+    chosen = {0}
+    budget = max_words - len(sentences[0].split())
+    for index in sorted(range(1, len(sentences)), key=lambda i: score(sentences[i]), reverse=True):
+        length = len(sentences[index].split())
+        if length <= budget:
+            chosen.add(index)
+            budget -= length
+    parts: List[str] = []
+    for index in sorted(chosen):
+        if parts and index - 1 not in chosen:
+            parts.append("…")
+        parts.append(sentences[index])
+    if len(sentences) - 1 not in chosen:
+        parts.append("…")
+    return " ".join(parts)
+
+
+@lru_cache(maxsize=settings.get("context_cache_size", 4096))
+def compress_message(sender: str, text: str) -> str:
+    """The compressed form of one stored message (memoized)."""
+    if sender != Sender.SYSTEM.value:
+        return text.strip()
+    text = strip_boilerplate(text)
+    return extractive_snippet(text, settings.get("context_snippet_words", 80))
+
+
+@lru_cache(maxsize=settings.get("context_cache_size", 4096))
+def _shingles(text: str) -> frozenset:
+    words = _words(text)
+    if len(words) < 3:
+        return frozenset(words)
+    return frozenset(zip(words, words[1:], words[2:]))
+
+
+def _is_duplicate(a: frozenset, b: frozenset, threshold: float) -> bool:
+    """Whether the Jaccard similarity of two shingle sets reaches `threshold`."""
+    if not a or not b:
+        return a == b
+    # Sets whose sizes differ too much cannot reach the threshold
+    if min(len(a), len(b)) < threshold * max(len(a), len(b)):
+        return False
+    common = len(a & b)
+    return common >= threshold * (len(a) + len(b) - common)
+
+
+def compress_history(batch: MessageBatch) -> CompressedContext:
+    """
+    Compress a history batch into a transcript. Of near-duplicate turns
+    from the same sender only the most recent is kept.
+    """
+    threshold = settings.get("context_duplicate_threshold", 0.8)
+    compressed = [compress_message(sender, message) for sender, message in zip(batch.senders, batch.messages)]
+
+    kept: List[int] = []
+    seen: Dict[str, List[frozenset]] = {}
+    # Walk newest first so the latest of each set of duplicates survives
+    for index in reversed(range(len(batch))):
+        if not compressed[index]:
+            continue
+        shingles, earlier = _shingles(compressed[index]), seen.setdefault(batch.senders[index], [])
+        if any(_is_duplicate(shingles, other, threshold) for other in earlier):
+            continue
+        earlier.append(shingles)
+        kept.append(index)
+    kept.reverse()
+
+    text = "\n".join([f"{batch.senders[index]}: {compressed[index]}" for index in kept])
+    return CompressedContext(
+        text=text,
+        tokens=estimate_tokens(batch.transcript()),
+        compressed_tokens=estimate_tokens(text),
+        dropped_turns=len(batch) - len(kept)
+    )
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the retention policy for chat messages. Turns
+    older than the retention period are periodically archived to gzip
+    compressed NDJSON files on local storage and removed from the hot
+    messages table, keeping it small and history queries fast. Only one
+    archival run at a time goes on across the instance's workers.
+"""
+
+from datetime import datetime, timedelta, timezone
+from utils.config import setup_logger, settings
+from memory.supabase import SupabaseMemoryManager
+from typing import Callable, IO, Optional
+from dataclasses import dataclass
+from core.jobs import Job, jobs
+from utils.serialization import to_ndjson
+from utils.offload import cpu_pool
+import tempfile
+import asyncio
+import fcntl
+import gzip
+import os
+
+logger = setup_logger("retention.log")
+
+
+class RetentionBusyError(Exception):
+    """Raised when an archival run is requested while another one is running."""
+
+
+@dataclass
+class RetentionPolicy:
+    """How long messages stay in the hot table and where they are archived."""
+    days: float
+    interval: float
+    chunk_size: int
+    archive_dir: str
+
+    @property
+    def enabled(self) -> bool:
+        return self.days > 0
+
+    @classmethod
+    def from_settings(cls) -> "RetentionPolicy":
+        return cls(
+            days=settings.get("retention_days", 0),
+            interval=settings.get("retention_interval", 86400.0),
+            chunk_size=settings.get("retention_chunk_size", 500),
+            archive_dir=settings.get("archive_dir", "archive"),
+        )
+
+
+def _append_ndjson(path: str, lines: str) -> None:
+    """
+    Append NDJSON lines to a gzip file. Each call writes a complete gzip
+    member, so the file stays readable if the job is interrupted.
+    """
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.write(lines)
+
+
+async def archive_messages(
+    memory: SupabaseMemoryManager,
+    policy: RetentionPolicy,
+    job: Job
+) -> None:
+    """
+    Move messages older than the retention period to an archive file in
+    chunks. A chunk is written to the archive before it is deleted, so an
+    interruption can duplicate rows in the archive but never lose them.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=policy.days)
+    os.makedirs(policy.archive_dir, exist_ok=True)
+    path = os.path.join(policy.archive_dir, f"messages-{datetime.now():%Y%m%dT%H%M%S}.ndjson.gz")
+    job.detail.update(cutoff=cutoff.isoformat(), archive=path)
+
+    archived = 0
+    while True:
+        rows = await memory.fetch_messages_before(cutoff, policy.chunk_size)
+        if not rows:
+            break
+        lines = await cpu_pool.run(to_ndjson, rows, size=len(rows))
+        await asyncio.to_thread(_append_ndjson, path, lines)
+        archived += await memory.delete_message_ids([row["id"] for row in rows])
+        job.progress(archived)
+        if len(rows) < policy.chunk_size:
+            break
+
+    if archived:
+        logger.info(f"Archived {archived} messages older than {cutoff} to {path}")
+    else:
+        job.detail["archive"] = None
+
+
+def _lock_retention() -> Optional[IO[str]]:
+    """
+    Take the instance-wide retention lock without waiting. Returns the
+    locked file, holding the running job's ID, or None if it is taken.
+    """
+    path = os.path.join(jobs.state_dir or tempfile.gettempdir(), "retention.lock")
+    lock = open(path, "a+")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.seek(0)
+        running = lock.read().strip()
+        lock.close()
+        raise RetentionBusyError(f"Retention job {running or 'on another worker'} is still running")
+    return lock
+
+
+def submit_retention_job(memory: SupabaseMemoryManager, policy: RetentionPolicy) -> Job:
+    """
+    Start an archival run as a background job. Raises RetentionBusyError
+    if one started by the admin endpoint or any worker's loop is running.
+    """
+    lock = _lock_retention()
+
+    async def run(job: Job) -> None:
+        try:
+            await archive_messages(memory, policy, job)
+        finally:
+            lock.close()
+
+    try:
+        job = jobs.submit("retention", run, retention_days=policy.days)
+    except BaseException:
+        lock.close()
+        raise
+    lock.truncate(0)
+    lock.write(job.id)
+    lock.flush()
+    return job
+
+
+async def retention_loop(
+    memory_factory: Callable[[], SupabaseMemoryManager],
+    policy: RetentionPolicy
+) -> None:
+    """Run the retention job every `policy.interval` seconds."""
+    while True:
+        try:
+            submit_retention_job(memory_factory(), policy)
+        except RetentionBusyError as e:
+            logger.warning(f"{e}, skipping this run")
+        except Exception as e:
+            logger.error(f"Could not start retention job: {e}")
+        await asyncio.sleep(policy.interval)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the server-side replay buffer for streamed
+    assistant turns. Every turn gets a stream ID and its frames are kept
+    in a bounded per-stream ring buffer for a limited time, so a client
+    that loses its socket can reconnect with (stream_id, offset), receive
+    the missing tail and then follow the live continuation.
+
+    Frames are also appended to a spool directory shared by the workers of
+    an instance, so a resume accepted by another worker replays the spool.
+    Stream IDs start with the configured INSTANCE_ID, which is the key a
+    load balancer routes resumes on between instances.
+"""
+
+from utils.config import setup_logger, settings
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional, TextIO
+from utils.instance import INSTANCE_ID, shared_dir
+import asyncio
+import json
+import time
+import uuid
+import os
+
+logger = setup_logger("streams.log")
+
+TRUNCATED = "[TRUNCATED]"
+
+
+class StreamGapError(Exception):
+    """Raised when the requested offset has already been evicted."""
+
+
+class StreamSpool:
+    """
+    Append-only copy of every stream's frames in a directory shared by the
+    workers of an instance. Each line is a JSON-encoded frame; a `null`
+    line marks the end of the turn. Readers on other workers keep a
+    `.readers` file fresh so the owner knows the stream is being resumed.
+    """
+    def __init__(self, directory: str, poll_interval: float = 0.05):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.enabled = bool(directory)
+        self._swept_at = 0.0
+        if self.enabled:
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                logger.error(f"Stream spool disabled, cannot create {directory}: {e}")
+                self.enabled = False
+
+    def path(self, stream_id: str, suffix: str = ".ndjson") -> str:
+        return os.path.join(self.directory, stream_id.replace(":", "_") + suffix)
+
+    def open(self, stream_id: str) -> Optional[TextIO]:
+        """Open a new stream's spool file for appending, or None if spooling is off."""
+        if not self.enabled:
+            return None
+        try:
+            return open(self.path(stream_id), "a", encoding="utf-8", buffering=1)
+        except OSError as e:
+            logger.warning(f"Stream {stream_id} is not spooled: {e}")
+            return None
+
+    def exists(self, stream_id: str) -> bool:
+        return self.enabled and os.path.exists(self.path(stream_id))
+
+    def read(self, stream_id: str, start: int, stop: int) -> List[str]:
+        """Return the spooled frames with offsets in [start, stop), or fewer if missing."""
+        frames: List[str] = []
+        if not self.enabled:
+            return frames
+        try:
+            with open(self.path(stream_id), encoding="utf-8") as f:
+                for offset, line in enumerate(f):
+                    if offset >= stop or not line.endswith("\n"):
+                        break
+                    frame = json.loads(line)
+                    if frame is None:
+                        break
+                    if offset >= start:
+                        frames.append(frame)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read the spool of stream {stream_id}: {e}")
+            return []
+        return frames
+
+    async def follow(self, stream_id: str, offset: int, stall_timeout: float) -> AsyncGenerator[str, None]:
+        """
+        Yield the spooled frames of a stream owned by another worker from
+        `offset` onwards, then poll for the live rest until its end marker.
+        """
+        path = self.path(stream_id)
+        readers = self.path(stream_id, ".readers")
+        with open(path, encoding="utf-8") as f:
+            line_number, last_growth, last_touch = 0, time.monotonic(), 0.0
+            while True:
+                position = f.tell()
+                line = f.readline()
+                if line.endswith("\n"):
+                    last_growth = time.monotonic()
+                    frame = json.loads(line)
+                    if frame is None:
+                        return
+                    if line_number >= offset:
+                        yield frame
+                    line_number += 1
+                    continue
+                # Partly written line or no new frame yet
+                f.seek(position)
+                now = time.monotonic()
+                if now - last_growth > stall_timeout or not os.path.exists(path):
+                    raise StreamGapError(f"Stream {stream_id} stopped before it was finished")
+                if now - last_touch > 1.0:
+                    with open(readers, "a"):
+                        os.utime(readers)
+                    last_touch = now
+                await asyncio.sleep(self.poll_interval)
+
+    def has_reader(self, stream_id: str, within: float = 3.0) -> bool:
+        """Whether a worker other than the owner is following the stream."""
+        try:
+            return time.time() - os.path.getmtime(self.path(stream_id, ".readers")) < within
+        except OSError:
+            return False
+
+    def remove(self, stream_id: str) -> None:
+        for suffix in (".ndjson", ".readers"):
+            try:
+                os.unlink(self.path(stream_id, suffix))
+            except OSError:
+                pass
+
+    def sweep(self, ttl: float) -> None:
+        """Remove spool files idle for longer than `ttl`, at most every few seconds."""
+        now = time.time()
+        if not self.enabled or now - self._swept_at < min(30.0, ttl):
+            return
+        self._swept_at = now
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        if now - entry.stat().st_mtime > ttl:
+                            os.unlink(entry.path)
+                    except OSError:
+                        pass
+        except OSError as e:
+            logger.warning(f"Cannot sweep the stream spool: {e}")
+
+
+class StreamBuffer:
+    """
+    Bounded ring buffer of the frames sent for one assistant turn.
+    Offsets count frames from the start of the turn.
+    """
+    def __init__(self, stream_id: str, registry: "StreamReplayRegistry", max_frames: int):
+        self.stream_id = stream_id
+        self._registry = registry
+        self._spool = registry.spool.open(stream_id)
+        self._frames: Deque[str] = deque()
+        self._max_frames = max_frames
+        self.start = 0  # offset of the oldest retained frame
+        self.size = 0   # offset of the next frame
+        self.nbytes = 0
+        self.delivered = 0  # highest offset sent to any client
+        self.finished = False
+        self.subscribers = 0
+        self.updated_at = time.monotonic()
+        self._changed = asyncio.Event()
+        self._attached = asyncio.Event()
+
+    def append(self, frame: str) -> int:
+        """Append a frame and wake up waiting readers. Returns its offset."""
+        self._frames.append(frame)
+        self._write_spool(frame)
+        frame_bytes = len(frame.encode("utf-8"))
+        self.nbytes += frame_bytes
+        self._registry._account(frame_bytes)
+        if len(self._frames) > self._max_frames:
+            self.trim(self.start + 1)
+        offset = self.size
+        self.size += 1
+        self._touch()
+        self._registry._enforce_cap()
+        return offset
+
+    def finish(self) -> None:
+        """Mark the turn as complete."""
+        self.finished = True
+        self._write_spool(None)
+        self.close_spool()
+        self._touch()
+
+    def _write_spool(self, frame: Optional[str]) -> None:
+        if self._spool is None:
+            return
+        try:
+            self._spool.write(json.dumps(frame) + "\n")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Stopped spooling stream {self.stream_id}: {e}")
+            self.close_spool()
+
+    def close_spool(self) -> None:
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    @property
+    def has_remote_reader(self) -> bool:
+        """Whether a client is following this stream through another worker."""
+        return self._registry.spool.has_reader(self.stream_id)
+
+    def trim(self, offset: int) -> None:
+        """Drop retained frames below `offset`."""
+        freed = 0
+        while self._frames and self.start < offset:
+            freed += len(self._frames.popleft().encode("utf-8"))
+            self.start += 1
+        self.nbytes -= freed
+        self._registry._account(-freed)
+
+    def read_from(self, offset: int) -> List[str]:
+        """Return all retained frames from `offset` onwards."""
+        if offset < self.start:
+            raise StreamGapError(
+                f"Offset {offset} of stream {self.stream_id} is no longer buffered "
+                f"(oldest available is {self.start})"
+            )
+        return list(islice(self._frames, offset - self.start, None))
+
+    async def follow(self, offset: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Yield the frames of the stream from `offset` onwards and then the
+        live continuation until the turn is finished. Frames already trimmed
+        from memory are read from the spool; those that are gone are
+        reported with a `[TRUNCATED] <count>` frame, which takes no offset.
+        """
+        self.attach()
+        try:
+            while True:
+                if offset < self.start:
+                    missing = self._registry.spool.read(self.stream_id, offset, self.start)
+                    if not missing:
+                        logger.warning(f"Stream {self.stream_id} replay skips frames {offset}-{self.start - 1}")
+                        yield f"{TRUNCATED} {self.start - offset}"
+                        offset = self.start
+                    for frame in missing:
+                        yield frame
+                        offset += 1
+                        self.delivered = max(self.delivered, offset)
+                    continue
+                for frame in self.read_from(offset):
+                    yield frame
+                    offset += 1
+                    self.delivered = max(self.delivered, offset)
+                if self.finished and offset >= self.size:
+                    return
+                await self.wait_for_frames(offset)
+        finally:
+            self.detach()
+
+    async def wait_for_frames(self, offset: int) -> None:
+        """Wait until a frame at `offset` exists or the turn is finished."""
+        while self.size <= offset and not self.finished:
+            await self._changed.wait()
+
+    def attach(self) -> None:
+        """Register a client reading this stream."""
+        self.subscribers += 1
+        self._attached.set()
+
+    def detach(self) -> None:
+        """Unregister a client reading this stream."""
+        self.subscribers = max(0, self.subscribers - 1)
+        if not self.subscribers:
+            self._attached.clear()
+
+    async def wait_for_subscriber(self) -> None:
+        """Wait until at least one client is reading this stream."""
+        await self._attached.wait()
+
+    def _touch(self) -> None:
+        self.updated_at = time.monotonic()
+        # Wake current waiters and arm a fresh event for the next frame
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class StreamReplayRegistry:
+    """
+    Process-wide registry of stream buffers with a TTL and a global
+    memory cap. When the cap is exceeded finished streams are evicted
+    oldest first, then frames already delivered from live streams; the
+    spool keeps them until the TTL. Stream IDs carry the instance ID so a
+    reconnect that lands on another instance can be told where it lives.
+    """
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        max_frames: int,
+        instance_id: str = INSTANCE_ID,
+        spool: Optional[StreamSpool] = None
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_frames = max_frames
+        self.instance_id = instance_id
+        self.spool = spool or StreamSpool("")
+        self.nbytes = 0
+        self.evictions = 0
+        self._streams: "OrderedDict[str, StreamBuffer]" = OrderedDict()
+
+    def create(self) -> StreamBuffer:
+        """Create a buffer for a new assistant turn."""
+        self.purge_expired()
+        stream_id = f"{self.instance_id}:{uuid.uuid4().hex}"
+        stream = StreamBuffer(stream_id, self, self.max_frames)
+        self._streams[stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str) -> Optional[StreamBuffer]:
+        """Return the buffer for a stream if it is still held by this worker."""
+        self.purge_expired()
+        return self._streams.get(stream_id)
+
+    def follow_spooled(self, stream_id: str, offset: int) -> Optional[AsyncGenerator[str, None]]:
+        """
+        Follow a stream of this instance through the spool, e.g. one owned
+        by another worker. Returns None when the stream is not spooled.
+        """
+        if self.owner(stream_id) != self.instance_id or not self.spool.exists(stream_id):
+            return None
+        return self.spool.follow(stream_id, offset, stall_timeout=self.ttl)
+
+    def discard(self, stream_id: str) -> None:
+        """Drop a stream that will never be resumed."""
+        stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            stream.trim(stream.size)
+            stream.close_spool()
+        self.spool.remove(stream_id)
+
+    @staticmethod
+    def owner(stream_id: str) -> str:
+        """Return the ID of the instance that owns a stream."""
+        return stream_id.split(":", 1)[0]
+
+    def purge_expired(self) -> None:
+        """Drop streams idle for longer than the TTL."""
+        now = time.monotonic()
+        for stream_id, stream in list(self._streams.items()):
+            if now - stream.updated_at > self.ttl and not stream.subscribers:
+                self._drop(stream_id)
+                self.spool.remove(stream_id)
+        self.spool.sweep(self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return buffer occupancy for the metrics endpoint."""
+        return {
+            "instance_id": self.instance_id,
+            "spool": self.spool.directory if self.spool.enabled else None,
+            "streams": len(self._streams),
+            "active_streams": sum(1 for s in self._streams.values() if not s.finished),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def _account(self, delta: int) -> None:
+        self.nbytes += delta
+
+    def _enforce_cap(self) -> None:
+        if self.nbytes <= self.max_bytes:
+            return
+        # Oldest finished streams go first
+        for stream_id, stream in list(self._streams.items()):
+            if self.nbytes <= self.max_bytes:
+                return
+            if stream.finished and not stream.subscribers:
+                self._drop(stream_id)
+        # Then frames live clients have already received
+        for stream in list(self._streams.values()):
+            if self.nbytes <= self.max_bytes:
+                return
+            stream.trim(stream.delivered)
+        if self.nbytes > self.max_bytes:
+            logger.warning(f"Stream buffers use {self.nbytes} bytes, above the {self.max_bytes} cap")
+
+    def _drop(self, stream_id: str) -> None:
+        stream = self._streams.pop(stream_id, None)
+        if stream is not None:
+            stream.trim(stream.size)
+            stream.close_spool()
+            self.evictions += 1
+
+
+stream_registry = StreamReplayRegistry(
+    max_bytes=settings.get("stream_buffer_max_bytes", 64 * 1024 * 1024),
+    ttl=settings.get("stream_buffer_ttl", 300.0),
+    max_frames=settings.get("stream_buffer_max_frames", 4096),
+    spool=StreamSpool(shared_dir("streams", settings.get("stream_spool_dir", ""))),
+)
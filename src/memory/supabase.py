@@ -10,12 +10,13 @@ DESCRIPTION:
 """
 
 from supabase import create_client, Client
-from models.supabase import MessageRecord
+from models.supabase import MESSAGE_COLUMNS, MessageBatch, MessageRecord, decode_history
+from utils.offload import cpu_pool
 from utils.config import settings
+from utils.tracing import tracer
 from loguru._logger import Logger
-from utils.types import Sender
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
-from typing import List
 import asyncio
 import logging
 import uuid
@@ -88,9 +89,10 @@ class SupabaseMemoryManager:
             }
             
             # Insert into messages table
-            result = await asyncio.to_thread(
-                lambda: self._client.table("messages").insert(message_data).execute()
-            )
+            with tracer.span("supabase.add_message_record", sender=message.sender.value):
+                result = await asyncio.to_thread(
+                    lambda: self._client.table("messages").insert(message_data).execute()
+                )
             
             if result.data:
                 self.logger.info(f"Message record added successfully: {result.data[0]['id']}")
@@ -108,10 +110,11 @@ class SupabaseMemoryManager:
         chat_id: str,
         query: str = "",
         limit: int = 3
-    ) -> List[MessageRecord]:
+    ) -> MessageBatch:
         """
         Retrieve conversation history for a user and optionally a specific chat.
         Filters and prioritizes messages based on relevance to the query.
+        Rows are decoded into a compact `MessageBatch` without validation.
         """
         try:
             self.logger.info(f"Retrieving conversation history for user {user_id} and chat {chat_id}")
@@ -122,76 +125,190 @@ class SupabaseMemoryManager:
 
             self.logger.debug(f"UUIDs after ensure_uuid - user_id: {user_id}, chat_id: {chat_id}")
 
-            query_builder = self._client.table("messages").select("*").eq("user_id", user_id).eq("chat_id", chat_id)
+            query_builder = self._client.table("messages").select(MESSAGE_COLUMNS).eq("user_id", user_id).eq("chat_id", chat_id)
 
-            result = await asyncio.to_thread(
-                lambda: query_builder.order("timestamp", desc=False).limit(limit * 2).execute()
-            )
+            with tracer.span("supabase.get_conversation_history", limit=limit) as span:
+                result = await asyncio.to_thread(
+                    lambda: query_builder.order("timestamp", desc=False).limit(limit * 2).execute()
+                )
+                span.set_attribute("rows", len(result.data or []))
 
             if result.data:
-                self.logger.debug(f"Retrieved data: {result.data}")
-                messages = []
-                for record in result.data:
-                    message = MessageRecord(
-                        user_id=str(record["user_id"]),
-                        chat_id=str(record.get("chat_id", "")),
-                        sender=Sender(record["sender"]),
-                        message=record["message"],
-                        meta=record.get("meta", {}),
-                        timestamp=datetime.fromisoformat(record["timestamp"].replace('Z', '+00:00'))
-                    )
-                    messages.append(message)
-
-                # Filter messages based on relevance to the query
-                if query:
-                    messages = sorted(
-                        messages,
-                        key=lambda msg: self._calculate_relevance(msg.message, query),
-                        reverse=True
-                    )
-
-                # Limit the number of messages returned
-                messages = messages[:limit]
+                self.logger.debug(f"Retrieved {len(result.data)} rows")
+                # Decoding and ranking large results is moved off the event loop
+                messages = await cpu_pool.run(decode_history, result.data, query, limit, size=len(result.data))
 
                 self.logger.info(f"Retrieved {len(messages)} relevant messages")
                 return messages
             else:
                 self.logger.debug("No data returned from query")
-                return []
+                return MessageBatch.from_rows([])
 
         except Exception as e:
             self.logger.error(f"Error retrieving conversation history: {e}")
-            return []
+            return MessageBatch.from_rows([])
 
-    def _calculate_relevance(self, message: str, query: str) -> float:
+    async def get_last_message(self, user_id: str, chat_id: str, sender: str) -> Optional[str]:
         """
-        Calculate the relevance of a message to the query.
-        This is a placeholder for a more sophisticated relevance algorithm.
+        Return the text of the most recent message from `sender` in a chat,
+        or None when the chat has none.
         """
-        return query.lower() in message.lower()
+        query_builder = (
+            self._client.table("messages").select("message")
+            .eq("user_id", self.ensure_uuid(user_id))
+            .eq("chat_id", self.ensure_uuid(chat_id))
+            .eq("sender", sender)
+        )
+        with tracer.span("supabase.get_last_message"):
+            result = await asyncio.to_thread(
+                lambda: query_builder.order("timestamp", desc=True).limit(1).execute()
+            )
+        return result.data[0]["message"] if result.data else None
 
     async def clear_conversation_history(
         self,
         user_id: str,
-        chat_id: str
+        chat_id: str,
+        on_progress: Optional[Callable[[int], None]] = None
     ) -> bool:
         """
         Clear conversation history for a user and optionally a specific chat.
+        Rows are matched on the indexed user_id/chat_id columns and deleted
+        in bounded chunks.
         """
         try:
             self.logger.info(f"Clearing conversation history for user {user_id}")
 
-            query = self._client.table("messages").delete().eq("user_id", user_id).contains("meta", {"chat_id": chat_id})
-
-            result = await asyncio.to_thread(lambda: query.execute())
-            if hasattr(result, "error"):
-                self.logger.error(f"Error clearing conversation history: {getattr(result, "error")}")
-                return False
-            self.logger.info(f"{result.count} messages deleted")
+            deleted = await self.delete_messages(
+                on_progress=on_progress,
+                user_id=self.ensure_uuid(user_id),
+                chat_id=self.ensure_uuid(chat_id)
+            )
+            self.logger.info(f"{deleted} messages deleted")
 
             self.logger.info(f"Cleared conversation history successfully")
             return True
                 
         except Exception as e:
             self.logger.error(f"Error clearing conversation history: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    async def count_messages(self, **filters: str) -> int:
+        """
+        Count the messages matching equality filters on indexed columns.
+        """
+        query = self._client.table("messages").select("id", count="exact")
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        result = await asyncio.to_thread(lambda: query.limit(1).execute())
+        return result.count or 0
+
+    async def delete_messages(
+        self,
+        chunk_size: Optional[int] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
+        **filters: str
+    ) -> int:
+        """
+        Delete the messages matching equality filters on indexed columns,
+        at most `chunk_size` rows per statement. Returns the number deleted.
+        """
+        chunk_size = chunk_size or settings.get("delete_chunk_size", 500)
+        deleted = 0
+        while True:
+            query = self._client.table("messages").select("id")
+            for column, value in filters.items():
+                query = query.eq(column, value)
+            with tracer.span("supabase.select_ids", limit=chunk_size):
+                result = await asyncio.to_thread(
+                    lambda: query.order("id").limit(chunk_size).execute()
+                )
+            ids = [row["id"] for row in result.data or []]
+            if not ids:
+                break
+
+            deleted += await self.delete_message_ids(ids)
+            if on_progress is not None:
+                on_progress(deleted)
+            if len(ids) < chunk_size:
+                break
+        return deleted
+
+    async def delete_message_ids(self, ids: List[Any]) -> int:
+        """
+        Delete messages by primary key. Returns the number deleted, counted
+        from the rows the database returns. Rows missing from the result are
+        looked up again: those already gone (e.g. deleted by another job)
+        are fine, but if none were deleted and some remain, a PermissionError
+        is raised (e.g. row-level security), since callers select them again.
+        """
+        if not ids:
+            return 0
+        with tracer.span("supabase.delete_messages", rows=len(ids)):
+            result = await asyncio.to_thread(
+                lambda: self._client.table("messages").delete().in_("id", ids).execute()
+            )
+        deleted = len(result.data or [])
+        if deleted == len(ids):
+            return deleted
+
+        with tracer.span("supabase.select_ids", rows=len(ids)):
+            result = await asyncio.to_thread(
+                lambda: self._client.table("messages").select("id").in_("id", ids).execute()
+            )
+        remaining = len(result.data or [])
+        if remaining and not deleted:
+            raise PermissionError(
+                f"No messages deleted and {remaining} of {len(ids)} remain; check the key's delete permissions"
+            )
+        if remaining:
+            self.logger.warning(f"Deleted {deleted} of {len(ids)} messages, {remaining} remain")
+        else:
+            self.logger.info(f"Deleted {deleted} of {len(ids)} messages, the rest were already gone")
+        return deleted
+
+    async def fetch_messages_before(self, cutoff: datetime, limit: int) -> List[Dict[str, Any]]:
+        """
+        Return up to `limit` raw message rows older than `cutoff`, oldest first.
+        """
+        with tracer.span("supabase.fetch_messages_before", limit=limit):
+            result = await asyncio.to_thread(
+                lambda: self._client.table("messages").select("*")
+                .lt("timestamp", cutoff.isoformat())
+                .order("timestamp", desc=False)
+                .limit(limit)
+                .execute()
+            )
+        return result.data or []
+
+    async def increment_usage_rollup(self, row: Dict[str, Any]) -> None:
+        """
+        Atomically add a usage delta to its (user_id, day, provider) rollup
+        row through the `increment_usage_rollup` database function.
+        """
+        params = {f"p_{key}": value for key, value in row.items()}
+        with tracer.span("supabase.increment_usage_rollup"):
+            await asyncio.to_thread(
+                lambda: self._client.rpc("increment_usage_rollup", params).execute()
+            )
+
+    async def fetch_usage_rollups(
+        self,
+        user_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return usage rollup rows, optionally for one user and an inclusive
+        range of days (ISO dates).
+        """
+        query = self._client.table("usage_rollups").select("*")
+        if user_id:
+            query = query.eq("user_id", user_id)
+        if start:
+            query = query.gte("day", start)
+        if end:
+            query = query.lte("day", end)
+        with tracer.span("supabase.fetch_usage_rollups"):
+            result = await asyncio.to_thread(lambda: query.execute())
+        return result.data or []
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines incremental token usage and cost rollups. Every
+    finished turn adds its usage to a pending per-(user, day, provider)
+    delta; deltas are periodically flushed to the `usage_rollups` table
+    with an atomic increment, so usage reports read a handful of rollup
+    rows instead of scanning the messages table.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from memory.supabase import SupabaseMemoryManager
+from utils.config import setup_logger
+from datetime import date
+import asyncio
+
+logger = setup_logger("usage.log")
+
+DIMENSIONS = {"user": "user_id", "day": "day", "provider": "provider"}
+TOTALS = ("turns", "input_tokens", "output_tokens", "total_tokens", "cost_usd")
+
+RollupKey = Tuple[str, str, str]
+
+
+def _empty() -> Dict[str, float]:
+    return {total: 0 for total in TOTALS}
+
+
+class UsageRollups:
+    """
+    Accumulates usage deltas in process and flushes them to Supabase.
+    Reports merge the stored rollups with deltas not yet flushed.
+    """
+    def __init__(self, memory_factory: Callable[[], SupabaseMemoryManager]):
+        self._memory_factory = memory_factory
+        self._pending: Dict[RollupKey, Dict[str, float]] = {}
+        self._flush_lock = asyncio.Lock()
+
+    def record(
+        self,
+        user_id: str,
+        provider: str,
+        usage: Dict[str, int],
+        cost: float,
+        day: Optional[date] = None,
+        turns: int = 1
+    ) -> None:
+        """
+        Add one turn's usage to its rollup. Usage of the turn served by
+        another provider is recorded separately with `turns=0`.
+        """
+        key = (user_id, (day or date.today()).isoformat(), provider)
+        delta = self._pending.setdefault(key, _empty())
+        delta["turns"] += turns
+        for total in ("input_tokens", "output_tokens", "total_tokens"):
+            delta[total] += usage.get(total, 0)
+        delta["cost_usd"] += cost
+
+    async def flush(self) -> int:
+        """
+        Write pending deltas to the rollup table. Deltas that fail to be
+        written are kept for the next flush. Returns the rows written.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            memory = self._memory_factory()
+            pending, self._pending = self._pending, {}
+            written = 0
+            for key, delta in pending.items():
+                user_id, day, provider = key
+                try:
+                    await memory.increment_usage_rollup(
+                        {"user_id": user_id, "day": day, "provider": provider, **delta}
+                    )
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Failed to flush usage rollup {key}: {e}")
+                    self._merge(key, delta)
+            return written
+
+    async def run(self, interval: float) -> None:
+        """Flush pending deltas every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Usage rollup flush failed: {e}")
+
+    async def report(
+        self,
+        group_by: Iterable[str] = ("day",),
+        user_id: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return usage totals grouped by any of `user`, `day` and `provider`,
+        optionally for one user and an inclusive range of ISO days.
+        """
+        columns = [DIMENSIONS[dimension] for dimension in group_by]
+        rows = await self._memory_factory().fetch_usage_rollups(user_id, start, end)
+        rows.extend(
+            {"user_id": k[0], "day": k[1], "provider": k[2], **delta}
+            for k, delta in self._pending.items()
+            if (not user_id or k[0] == user_id)
+            and (not start or k[1] >= start)
+            and (not end or k[1] <= end)
+        )
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            group_key = tuple(str(row[column]) for column in columns)
+            group = groups.setdefault(group_key, {**dict(zip(columns, group_key)), **_empty()})
+            for total in TOTALS:
+                group[total] += float(row.get(total) or 0) if total == "cost_usd" else int(row.get(total) or 0)
+        for group in groups.values():
+            group["cost_usd"] = round(group["cost_usd"], 6)
+        return sorted(groups.values(), key=lambda group: tuple(group[column] for column in columns))
+
+    def _merge(self, key: RollupKey, delta: Dict[str, float]) -> None:
+        pending = self._pending.setdefault(key, _empty())
+        for total, value in delta.items():
+            pending[total] += value
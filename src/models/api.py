@@ -12,6 +12,7 @@ meditreat application.
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime
+import uuid
 
 class UserInput(BaseModel):
     """
@@ -24,6 +25,14 @@ class UserInput(BaseModel):
     username: Optional[str] = "User"
     llm: Optional[str] = "openai"
     temperature: Optional[float] = 0.2
+    enable_search: Optional[bool] = None  # None lets the server decide per query
+
+class ResumeInput(BaseModel):
+    """
+    Request to resume a streamed answer after a reconnect.
+    """
+    stream_id: str
+    offset: int = 0  # number of frames already received after [STREAM]
 
 class StreamingChatInput(BaseModel):
     """
@@ -32,9 +41,20 @@ class StreamingChatInput(BaseModel):
     user_id: str
     message: str
     llm_provider: Optional[str] = "openai"
-    enable_search: Optional[bool] = True
+    enable_search: Optional[bool] = None  # None lets the server decide per query
     session_id: Optional[str] = None
 
+    def to_user_input(self) -> UserInput:
+        """Map the request onto the chat input used by every transport.
+        A missing session_id starts a new chat."""
+        return UserInput(
+            user_id=self.user_id,
+            chat_id=self.session_id or str(uuid.uuid4()),
+            message=self.message,
+            llm=self.llm_provider,
+            enable_search=self.enable_search
+        )
+
 class AgentStepResponse(BaseModel):
     """
     Represents a single step in the agent's process.
@@ -50,6 +70,7 @@ class ChatResponse(BaseModel):
     """
     message: str
     user_id: str
+    chat_id: Optional[str] = None
     timestamp: datetime
     sources: Optional[List[Dict[str, str]]] = None
 
@@ -12,7 +12,10 @@ DESCRIPTION:
 from pydantic import BaseModel, Field
 from utils.types import Sender
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Columns read back for conversation history
+MESSAGE_COLUMNS = "user_id,chat_id,sender,message,meta,timestamp"
 
 class MessageRecord(BaseModel):
     """
@@ -41,3 +44,106 @@ class MessageRecord(BaseModel):
         description="The timestamp of when the message was sent.",
         default_factory=datetime.now
     )
+
+
+class MessageBatch:
+    """
+    Column-oriented, read-only batch of message rows from our own database.
+    Rows are trusted, so no field is validated; timestamps stay as strings
+    until one is read, and `MessageRecord` objects are only built on demand.
+    """
+    __slots__ = ("user_ids", "chat_ids", "senders", "messages", "metas", "_raw_timestamps", "_timestamps")
+
+    def __init__(
+        self,
+        user_ids: List[str],
+        chat_ids: List[str],
+        senders: List[str],
+        messages: List[str],
+        metas: List[Optional[dict]],
+        raw_timestamps: List[str]
+    ):
+        self.user_ids = user_ids
+        self.chat_ids = chat_ids
+        self.senders = senders
+        self.messages = messages
+        self.metas = metas
+        self._raw_timestamps = raw_timestamps
+        self._timestamps: List[Optional[datetime]] = [None] * len(messages)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "MessageBatch":
+        """Decode Supabase rows column by column."""
+        return cls(
+            user_ids=[str(row["user_id"]) for row in rows],
+            chat_ids=[str(row.get("chat_id", "")) for row in rows],
+            senders=[row["sender"] for row in rows],
+            messages=[row["message"] for row in rows],
+            metas=[row.get("meta") for row in rows],
+            raw_timestamps=[row["timestamp"] for row in rows]
+        )
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __bool__(self) -> bool:
+        return bool(self.messages)
+
+    def timestamp(self, index: int) -> datetime:
+        """Parse and cache the timestamp of one row."""
+        parsed = self._timestamps[index]
+        if parsed is None:
+            parsed = datetime.fromisoformat(self._raw_timestamps[index].replace('Z', '+00:00'))
+            self._timestamps[index] = parsed
+        return parsed
+
+    def select(self, indices: Iterable[int]) -> "MessageBatch":
+        """Return the rows at `indices`, in that order, as a new batch."""
+        indices = list(indices)
+        batch = MessageBatch(
+            user_ids=[self.user_ids[i] for i in indices],
+            chat_ids=[self.chat_ids[i] for i in indices],
+            senders=[self.senders[i] for i in indices],
+            messages=[self.messages[i] for i in indices],
+            metas=[self.metas[i] for i in indices],
+            raw_timestamps=[self._raw_timestamps[i] for i in indices]
+        )
+        batch._timestamps = [self._timestamps[i] for i in indices]
+        return batch
+
+    def transcript(self) -> str:
+        """Render the rows as `sender: message` lines for a prompt."""
+        return "\n".join([f"{sender}: {message}" for sender, message in zip(self.senders, self.messages)])
+
+    def record(self, index: int) -> MessageRecord:
+        """Build the full, validated `MessageRecord` of one row."""
+        return MessageRecord(
+            user_id=self.user_ids[index],
+            chat_id=self.chat_ids[index],
+            sender=self.senders[index],
+            message=self.messages[index],
+            meta=self.metas[index],
+            timestamp=self._timestamps[index] or self._raw_timestamps[index]
+        )
+
+    def records(self) -> List[MessageRecord]:
+        """Build the full `MessageRecord` of every row."""
+        return [self.record(index) for index in range(len(self))]
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        return (self.record(index) for index in range(len(self)))
+
+
+def decode_history(rows: List[Dict[str, Any]], query: str = "", limit: int = 3) -> MessageBatch:
+    """
+    Decode history rows and keep the `limit` most relevant to the query,
+    in stored order when there is no query. Runs in the CPU pool for
+    large results, so it only uses picklable arguments.
+    """
+    batch = MessageBatch.from_rows(rows)
+    order = range(len(batch))
+    if query:
+        # Messages containing the query first; a placeholder for a better ranking
+        query = query.lower()
+        order = sorted(order, key=lambda i: query in batch.messages[i].lower(), reverse=True)
+    return batch.select(order[:limit])
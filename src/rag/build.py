@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the offline builder of the local knowledge index.
+    It chunks a curated medical corpus (a directory of .txt/.md files or a
+    JSONL file of {"title", "text", "source"} records), embeds the chunks
+    in batches straight into a memory-mapped matrix and optionally adds an
+    IVF partitioning for larger corpora.
+
+    Usage (from the src directory):
+        python -m rag.build ../data/corpus --out ../data/knowledge_index --embeddings hashing
+        python -m rag.build corpus.jsonl --out ../data/knowledge_index --nlist 256
+"""
+
+from utils.config import setup_logger, settings
+from typing import Any, Dict, Iterator, List
+from rag.embeddings import get_embeddings
+from rag.index import MANIFEST, build_ivf, normalize
+from datetime import datetime
+import numpy as np
+import argparse
+import shutil
+import json
+import re
+import os
+
+logger = setup_logger("rag_build.log")
+
+_HEADING_RE = re.compile(r"^#+\s*")
+
+
+def chunk_text(text: str, chunk_words: int = 180, overlap: int = 40) -> List[str]:
+    """
+    Split text into chunks of about `chunk_words` words. Paragraphs are
+    packed together; paragraphs longer than a chunk are split into windows
+    that overlap by `overlap` words.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if len(current) + len(words) <= chunk_words:
+            current.extend(words)
+            continue
+        if current:
+            chunks.append(" ".join(current))
+            current = []
+        step = max(1, chunk_words - overlap)
+        while len(words) > chunk_words:
+            chunks.append(" ".join(words[:chunk_words]))
+            words = words[step:]
+        current = list(words)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def iter_documents(path: str) -> Iterator[Dict[str, str]]:
+    """Yield {"source", "title", "text"} documents from a corpus path."""
+    if os.path.isfile(path) and path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                yield {
+                    "source": record.get("source") or f"{os.path.basename(path)}:{line_number}",
+                    "title": record.get("title", ""),
+                    "text": record.get("text", ""),
+                }
+        return
+
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if not name.endswith((".txt", ".md")):
+                continue
+            file_path = os.path.join(root, name)
+            with open(file_path, encoding="utf-8") as f:
+                text = f.read()
+            first_line = text.strip().splitlines()[0] if text.strip() else ""
+            title = _HEADING_RE.sub("", first_line) if first_line.startswith("#") else os.path.splitext(name)[0]
+            yield {"source": os.path.relpath(file_path, path), "title": title, "text": text}
+
+
+def build_index(
+    corpus: str,
+    out_dir: str,
+    embeddings_name: str = "hashing",
+    chunk_words: int = 180,
+    overlap: int = 40,
+    batch_size: int = 64,
+    nlist: int = 0
+) -> Dict[str, Any]:
+    """
+    Build an index directory from a corpus and return its manifest. The
+    index is written next to `out_dir` and swapped in when complete.
+    """
+    tmp_dir = f"{out_dir}.building"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # Pass 1: chunk the corpus to disk, recording where each row starts
+    offsets = [0]
+    documents = 0
+    with open(os.path.join(tmp_dir, "chunks.jsonl"), "wb") as f:
+        for document in iter_documents(corpus):
+            documents += 1
+            for text in chunk_text(document["text"], chunk_words, overlap):
+                row = {"id": len(offsets) - 1, "source": document["source"], "title": document["title"], "text": text}
+                f.write(json.dumps(row).encode("utf-8") + b"\n")
+                offsets.append(f.tell())
+    count = len(offsets) - 1
+    if not count:
+        shutil.rmtree(tmp_dir)
+        raise ValueError(f"No text found in corpus {corpus}")
+    np.save(os.path.join(tmp_dir, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    # Pass 2: embed in batches straight into the memory-mapped matrix
+    embeddings = get_embeddings(embeddings_name)
+    matrix = None
+    with open(os.path.join(tmp_dir, "chunks.jsonl"), encoding="utf-8") as f:
+        batch: List[str] = []
+        row = 0
+        for line in f:
+            batch.append(json.loads(line)["text"])
+            if len(batch) == batch_size:
+                matrix, row = _write_batch(tmp_dir, matrix, embeddings, batch, row, count)
+                batch = []
+        if batch:
+            matrix, row = _write_batch(tmp_dir, matrix, embeddings, batch, row, count)
+    matrix.flush()
+    dim = matrix.shape[1]
+    del matrix
+
+    if nlist:
+        nlist = min(nlist, count)
+        build_ivf(tmp_dir, nlist)
+
+    manifest = {
+        "embeddings": embeddings_name,
+        "model": getattr(embeddings, "model", None),
+        "dim": dim,
+        "documents": documents,
+        "chunks": count,
+        "chunk_words": chunk_words,
+        "overlap": overlap,
+        "nlist": nlist,
+        "created_at": datetime.now().isoformat(),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = f"{out_dir}.old"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logger.info(f"Built knowledge index with {count} chunks from {documents} documents in {out_dir}")
+    return manifest
+
+
+def _write_batch(tmp_dir, matrix, embeddings, texts, row, count):
+    vectors = normalize(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+    if matrix is None:
+        matrix = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, "embeddings.npy"), mode="w+", dtype=np.float32, shape=(count, vectors.shape[1])
+        )
+    matrix[row:row + len(vectors)] = vectors
+    return matrix, row + len(vectors)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the local medical knowledge index.")
+    parser.add_argument("corpus", help="directory of .txt/.md files or a .jsonl file")
+    parser.add_argument("--out", default=settings.get("knowledge_index_dir"))
+    parser.add_argument("--embeddings", choices=("hashing", "openai"), default=settings.get("embeddings", "hashing"))
+    parser.add_argument("--chunk-words", type=int, default=180)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF partitions; 0 for exact search")
+    args = parser.parse_args()
+
+    manifest = build_index(
+        args.corpus,
+        args.out,
+        embeddings_name=args.embeddings,
+        chunk_words=args.chunk_words,
+        overlap=args.overlap,
+        batch_size=args.batch_size,
+        nlist=args.nlist
+    )
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
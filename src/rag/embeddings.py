@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the embedding models used by the local knowledge
+    index. `HashingEmbeddings` is a deterministic, dependency-free stand-in
+    (hashed word unigrams and bigrams) so the index can be built and
+    queried offline; `get_embeddings` returns it or a provider model.
+"""
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from utils.config import settings
+from typing import List, Optional
+import numpy as np
+import hashlib
+import re
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Feature-hashing embeddings: every word and word pair is hashed to a
+    signed bucket and the vector is L2-normalized. Captures lexical overlap
+    only, but needs no model, network or training.
+    """
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            index, sign = self._bucket(feature)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def get_embeddings(name: str = "hashing", dim: Optional[int] = None, model: Optional[str] = None) -> Embeddings:
+    """
+    Return the embedding model for the index.
+    `hashing` is the offline stand-in; `openai` uses the provider's
+    embedding model from EMBEDDING_MODEL. An existing index passes the
+    `dim` and `model` it was built with, which override the settings.
+    """
+    if name == "openai":
+        return OpenAIEmbeddings(
+            model=model or settings.get("embedding_model", "text-embedding-3-small"),
+            api_key=settings.get("openai_api_key"),
+            base_url=settings.get("base_url")
+        )
+    return HashingEmbeddings(dim=dim or settings.get("embedding_dim", 512))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the on-disk vector index of the local medical
+    knowledge base. Chunk embeddings are stored as a normalized float32
+    NumPy matrix that is memory-mapped at query time, next to a JSONL file
+    of chunk metadata read by offset. Search is a vectorized top-k cosine
+    similarity, optionally restricted to the nearest partitions of an
+    inverted-file (IVF) layout built with spherical k-means.
+
+    Index directory layout:
+        manifest.json     embedder name, dimensions, counts, IVF settings
+        embeddings.npy    (n, dim) float32, L2-normalized rows
+        chunks.jsonl      one {"id", "source", "title", "text"} per row
+        offsets.npy       (n + 1) byte offsets of the rows in chunks.jsonl
+        centroids.npy     (nlist, dim) IVF centroids        [optional]
+        ivf_rows.npy      row ids ordered by partition      [optional]
+        ivf_bounds.npy    (nlist + 1) partition boundaries  [optional]
+"""
+
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass
+import numpy as np
+import json
+import os
+
+MANIFEST = "manifest.json"
+
+
+@dataclass(frozen=True)
+class RetrievedChunk:
+    """A knowledge base chunk returned for a query."""
+    id: int
+    score: float
+    text: str
+    source: str
+    title: str
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a matrix, leaving zero rows as they are."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    sample: int = 20000,
+    seed: int = 0
+) -> np.ndarray:
+    """Cluster normalized vectors by cosine similarity; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[np.sort(rng.choice(len(vectors), sample, replace=False))]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+            else:
+                # Re-seed empty clusters with a random vector
+                centroids[cluster] = vectors[rng.integers(len(vectors))]
+        centroids = normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+def build_ivf(index_dir: str, nlist: int, batch_size: int = 65536) -> None:
+    """Partition an existing index into `nlist` inverted lists."""
+    embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+    centroids = spherical_kmeans(embeddings, nlist)
+
+    assignment = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), batch_size):
+        block = np.asarray(embeddings[start:start + batch_size])
+        assignment[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+
+    rows = np.argsort(assignment, kind="stable").astype(np.int64)
+    bounds = np.searchsorted(assignment[rows], np.arange(nlist + 1)).astype(np.int64)
+    np.save(os.path.join(index_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(index_dir, "ivf_rows.npy"), rows)
+    np.save(os.path.join(index_dir, "ivf_bounds.npy"), bounds)
+
+
+class VectorIndex:
+    """
+    Read-only view of an index directory. Embeddings are memory-mapped, so
+    opening the index is cheap and pages are loaded by the OS on demand.
+    """
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, MANIFEST), encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        self.embeddings = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r")
+        self._chunks = os.open(os.path.join(index_dir, "chunks.jsonl"), os.O_RDONLY)
+
+        self.centroids: Optional[np.ndarray] = None
+        if os.path.exists(os.path.join(index_dir, "centroids.npy")):
+            self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+            self.ivf_rows = np.load(os.path.join(index_dir, "ivf_rows.npy"), mmap_mode="r")
+            self.ivf_bounds = np.load(os.path.join(index_dir, "ivf_bounds.npy"))
+
+    @property
+    def size(self) -> int:
+        return len(self.embeddings)
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    def search(self, query: np.ndarray, k: int = 4, nprobe: int = 4) -> List[tuple[int, float]]:
+        """
+        Return (row, cosine score) pairs of the k nearest chunks. With IVF,
+        only the `nprobe` partitions closest to the query are scanned.
+        """
+        query = normalize(np.asarray(query, dtype=np.float32))
+        if self.centroids is None or nprobe >= len(self.centroids):
+            scores = self.embeddings @ query
+            best = top_k(scores, k)
+            return [(int(row), float(scores[row])) for row in best]
+
+        partitions = top_k(self.centroids @ query, nprobe)
+        candidates = np.concatenate([
+            self.ivf_rows[self.ivf_bounds[p]:self.ivf_bounds[p + 1]] for p in partitions
+        ])
+        if not len(candidates):
+            return []
+        candidates.sort()  # sequential reads from the memory map
+        scores = self.embeddings[candidates] @ query
+        best = top_k(scores, k)
+        return [(int(candidates[i]), float(scores[i])) for i in best]
+
+    def chunk(self, row: int) -> Dict[str, Any]:
+        """Read the metadata of one chunk (safe to call from several threads)."""
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(os.pread(self._chunks, end - start, start))
+
+    def close(self) -> None:
+        os.close(self._chunks)
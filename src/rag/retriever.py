@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the query-time retriever of the local medical
+    knowledge base. It embeds the user query with the same model the
+    index was built with, runs a top-k cosine search over the
+    memory-mapped index and formats the hits as context for the model.
+"""
+
+from utils.config import setup_logger, settings
+from rag.index import RetrievedChunk, VectorIndex
+from langchain_core.embeddings import Embeddings
+from rag.embeddings import get_embeddings
+from utils.metrics import metrics
+from typing import List, Optional
+import threading
+import time
+import os
+
+logger = setup_logger("rag.log")
+
+
+class EmbeddingMismatchError(ValueError):
+    """Raised when queries would be embedded differently from the index."""
+
+
+class KnowledgeRetriever:
+    """
+    Top-k semantic search over a local knowledge index. Queries are
+    embedded with the embedder, model and dimension recorded in the
+    index manifest, not the current settings.
+    """
+    def __init__(self, index_dir: str, embeddings: Optional[Embeddings] = None):
+        self.index = VectorIndex(index_dir)
+        manifest = self.index.manifest
+        self.embeddings = embeddings or get_embeddings(
+            manifest.get("embeddings", "hashing"),
+            dim=manifest.get("dim"),
+            model=manifest.get("model")
+        )
+        dim = getattr(self.embeddings, "dim", self.index.dim)
+        if dim != self.index.dim:
+            raise EmbeddingMismatchError(
+                f"Knowledge index at {index_dir} has {self.index.dim}-dimensional embeddings "
+                f"but the query embedder produces {dim}; rebuild the index"
+            )
+
+    def search(
+        self,
+        query: str,
+        k: int = 4,
+        min_score: float = 0.0,
+        nprobe: int = 8
+    ) -> List[RetrievedChunk]:
+        """Return up to `k` chunks scoring at least `min_score` for the query."""
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(query)
+        if len(vector) != self.index.dim:
+            raise EmbeddingMismatchError(f"Query embedding has {len(vector)} dimensions, the index {self.index.dim}")
+        hits = self.index.search(vector, k=k, nprobe=nprobe)
+
+        results = []
+        for row, score in hits:
+            if score < min_score:
+                continue
+            chunk = self.index.chunk(row)
+            results.append(RetrievedChunk(
+                id=row,
+                score=score,
+                text=chunk["text"],
+                source=chunk.get("source", ""),
+                title=chunk.get("title", "")
+            ))
+        metrics.observe("rag.search_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("rag.hits", len(results))
+        return results
+
+
+def format_knowledge(chunks: List[RetrievedChunk]) -> str:
+    """Format retrieved chunks as a numbered, attributed context block."""
+    lines = ["Relevant medical knowledge:"]
+    for number, chunk in enumerate(chunks, start=1):
+        label = chunk.title or chunk.source
+        lines.append(f"[{number}] {label}: {chunk.text}")
+    return "\n".join(lines)
+
+
+_retriever: Optional[KnowledgeRetriever] = None
+_retriever_error: Optional[Exception] = None
+_retriever_loaded = False
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> Optional[KnowledgeRetriever]:
+    """
+    Return the shared retriever, or None when retrieval is disabled, no
+    index has been built at KNOWLEDGE_INDEX_DIR or it failed to load. The
+    index is loaded by the first call, which blocks on disk, so make it
+    from a thread. A failure is logged once and kept, see `retriever_error`.
+    """
+    global _retriever, _retriever_error, _retriever_loaded
+    if not settings.get("rag_enabled", True):
+        return None
+    if not _retriever_loaded:
+        with _retriever_lock:
+            if not _retriever_loaded:
+                index_dir = settings.get("knowledge_index_dir", "")
+                try:
+                    if os.path.exists(os.path.join(index_dir, "manifest.json")):
+                        _retriever = KnowledgeRetriever(index_dir)
+                        logger.info(f"Loaded knowledge index with {_retriever.index.size} chunks from {index_dir}")
+                except Exception as e:
+                    _retriever_error = e
+                    logger.error(f"Knowledge retrieval is off, the index at {index_dir} failed to load: {e}")
+                _retriever_loaded = True
+    return _retriever
+
+
+def retriever_loaded() -> bool:
+    """Whether `get_retriever` returns without touching the disk."""
+    return _retriever_loaded or not settings.get("rag_enabled", True)
+
+
+def retriever_error() -> Optional[Exception]:
+    """The error the knowledge index failed to load with, if any."""
+    return _retriever_error
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module is the production launcher of the API. It runs several
+    uvicorn worker processes, one per core by default, so sockets are
+    spread over as many event loops. Workers share resumable streams and
+    job progress through the instance's shared directory. Each worker
+    warms its own process pool, clients and caches in the application
+    lifespan.
+
+    Usage:
+        python src/serve.py --workers 4 --port 8000
+"""
+
+from utils.config import settings
+from utils.offload import cpu_count, web_concurrency
+import argparse
+import uvicorn
+import os
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the Meditreat API with several workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=web_concurrency(), help="defaults to WEB_CONCURRENCY; 0 means one per core")
+    args = parser.parse_args()
+    # uvicorn treats 0 workers as 1
+    workers = args.workers or cpu_count()
+
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_keep_alive=75,
+        # Leave room for in-flight turns to drain on shutdown
+        timeout_graceful_shutdown=int(settings.get("ws_drain_timeout", 25.0)) + 5
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -136,11 +136,11 @@ async def setup_async_logger(
         logger.addHandler(ch)
         return logger
 
-def load_system_prompt():
+def load_system_prompt(file_name: str = "base_system_prompt.txt"):
     """Loads the system prompt to the settings for use in LLMs.
     """
     try:
-        with open(os.path.join(basedir, "src", "prompts", "base_system_prompt.txt")) as f:
+        with open(os.path.join(basedir, "src", "prompts", file_name)) as f:
             prompt = f.read()
             return prompt
     except Exception as e:
@@ -161,8 +161,96 @@ class Settings(BaseSettings):
     temperature: float = float(config('TEMPERATURE', default=0.1))
     max_tokens: int = int(config('MAX_TOKENS', default=1024))
     top_p: float = config('TOP_P', default=1.0, cast=float)
+    # USD per million tokens, used for cost reporting
+    input_token_price: float = float(config('INPUT_TOKEN_PRICE', default=0.15))
+    output_token_price: float = float(config('OUTPUT_TOKEN_PRICE', default=0.60))
+    # JSON prices by provider and model, e.g. {"openai": {"gpt-4o": [2.5, 10]}}
+    token_prices: str = str(config('TOKEN_PRICES', default=""))
+    # Provider of history summaries; defaults to LLM_PROVIDER
+    summary_provider: str = str(config('SUMMARY_PROVIDER', default=""))
+    # Seconds between writes of usage rollups to the database
+    usage_flush_interval: float = float(config('USAGE_FLUSH_INTERVAL', default=30.0))
     system_prompt: str = load_system_prompt()
 
+    # Serving: WEB_CONCURRENCY=0 runs one worker per core; CPU_POOL_WORKERS=0
+    # splits the cores between the workers' process pools and -1 disables them
+    web_concurrency: int = int(config('WEB_CONCURRENCY', default=0))
+    cpu_pool_workers: int = int(config('CPU_POOL_WORKERS', default=0))
+    offload_min_items: int = int(config('OFFLOAD_MIN_ITEMS', default=5000))
+
+    # Shared provider connection pools (see llms/transport.py)
+    http_pool_providers: str = str(config('HTTP_POOL_PROVIDERS', default="openai"))
+    http2: bool = config('HTTP2', default=True, cast=bool)
+    http_max_connections: int = int(config('HTTP_MAX_CONNECTIONS', default=100))
+    http_max_keepalive: int = int(config('HTTP_MAX_KEEPALIVE', default=20))
+    http_keepalive_expiry: float = float(config('HTTP_KEEPALIVE_EXPIRY', default=120.0))
+    http_timeout: float = float(config('HTTP_TIMEOUT', default=60.0))
+    http_connect_timeout: float = float(config('HTTP_CONNECT_TIMEOUT', default=5.0))
+    http_warm_connections: int = int(config('HTTP_WARM_CONNECTIONS', default=2))
+    # Seconds of idleness after which an endpoint is pinged; keep below the expiry
+    http_ping_interval: float = float(config('HTTP_PING_INTERVAL', default=60.0))
+
+    # Small talk routing
+    small_talk_routing: bool = config('SMALL_TALK_ROUTING', default=True, cast=bool)
+    small_talk_max_tokens: int = int(config('SMALL_TALK_MAX_TOKENS', default=64))
+    small_talk_threshold: float = float(config('SMALL_TALK_THRESHOLD', default=0.8))
+    small_talk_prompt: str = load_system_prompt("small_talk_prompt.txt")
+
+    # Seconds to wait for upstream generation to stop after a client disconnects
+    cancel_timeout: float = float(config('CANCEL_TIMEOUT', default=2.0))
+
+    # Resumable streams
+    stream_buffer_max_bytes: int = int(config('STREAM_BUFFER_MAX_BYTES', default=64 * 1024 * 1024))
+    stream_buffer_max_frames: int = int(config('STREAM_BUFFER_MAX_FRAMES', default=4096))
+    stream_buffer_ttl: float = float(config('STREAM_BUFFER_TTL', default=300.0))
+    stream_resume_grace: float = float(config('STREAM_RESUME_GRACE', default=5.0))
+    # Routable ID of this instance, prefixed to stream IDs; defaults to the hostname
+    instance_id: str = config('INSTANCE_ID', default="")
+    # Directory shared by an instance's workers; defaults to /dev/shm or the temp dir
+    stream_spool_dir: str = config('STREAM_SPOOL_DIR', default="")
+    # Directory where jobs report progress to every worker; defaults next to the spool
+    job_state_dir: str = config('JOB_STATE_DIR', default="")
+
+    # WebSocket sessions
+    ws_max_connections: int = int(config('WS_MAX_CONNECTIONS', default=1000))
+    ws_max_session_bytes: int = int(config('WS_MAX_SESSION_BYTES', default=1024 * 1024))
+    ws_idle_timeout: float = float(config('WS_IDLE_TIMEOUT', default=60.0))
+    ws_ping_interval: float = float(config('WS_PING_INTERVAL', default=20.0))
+    ws_drain_timeout: float = float(config('WS_DRAIN_TIMEOUT', default=25.0))
+
+    # Tracing: TRACE_EXPORTER is one of none, file or otlp
+    trace_exporter: str = str(config('TRACE_EXPORTER', default="none"))
+    trace_file: str = str(config('TRACE_FILE', default=os.path.join(basedir, "logs", "traces.jsonl")))
+    otlp_endpoint: str = str(config('OTLP_ENDPOINT', default="http://localhost:4318/v1/traces"))
+    trace_sample_rate: float = float(config('TRACE_SAMPLE_RATE', default=1.0))
+
+    # Admin endpoints are disabled unless a token is set
+    admin_token: str = str(config('ADMIN_TOKEN', default=""))
+    profile_max_seconds: float = float(config('PROFILE_MAX_SECONDS', default=60.0))
+
+    # History compression before it is sent to the model
+    context_compression: bool = config('CONTEXT_COMPRESSION', default=True, cast=bool)
+    context_snippet_words: int = int(config('CONTEXT_SNIPPET_WORDS', default=80))
+    context_duplicate_threshold: float = float(config('CONTEXT_DUPLICATE_THRESHOLD', default=0.8))
+    context_cache_size: int = int(config('CONTEXT_CACHE_SIZE', default=4096))
+
+    # Local knowledge retrieval; EMBEDDINGS is hashing (offline) or openai
+    rag_enabled: bool = config('RAG_ENABLED', default=True, cast=bool)
+    knowledge_index_dir: str = str(config('KNOWLEDGE_INDEX_DIR', default=os.path.join(basedir, "data", "knowledge_index")))
+    embeddings: str = str(config('EMBEDDINGS', default="hashing"))
+    embedding_model: str = str(config('EMBEDDING_MODEL', default="text-embedding-3-small"))
+    embedding_dim: int = int(config('EMBEDDING_DIM', default=512))
+    rag_top_k: int = int(config('RAG_TOP_K', default=4))
+    rag_min_score: float = float(config('RAG_MIN_SCORE', default=0.2))
+    rag_nprobe: int = int(config('RAG_NPROBE', default=8))
+
+    # Data maintenance: chunked deletes and archival of old messages
+    delete_chunk_size: int = int(config('DELETE_CHUNK_SIZE', default=500))
+    retention_days: float = float(config('RETENTION_DAYS', default=0))
+    retention_interval: float = float(config('RETENTION_INTERVAL', default=86400.0))
+    retention_chunk_size: int = int(config('RETENTION_CHUNK_SIZE', default=500))
+    archive_dir: str = str(config('ARCHIVE_DIR', default=os.path.join(basedir, "archive")))
+
     # Database Configuration
     supabase_url: str = str(config('SUPABASE_URL', default="https://your-supabase-url"))
     supabase_key: str = str(config('SUPABASE_KEY', default="your-supabase-key"))
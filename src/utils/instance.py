@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module identifies the instance (container or host) a worker runs
+    in, and the directory its workers share for state that every worker
+    must see, such as resumable streams and background job progress.
+"""
+
+from utils.config import settings
+import tempfile
+import socket
+import os
+
+# Routable ID of this instance, shared by all of its workers
+INSTANCE_ID = (settings.get("instance_id", "") or socket.gethostname()).replace(":", "-")
+
+
+def shared_dir(name: str, configured: str = "") -> str:
+    """
+    The directory `name` in this instance's shared state, memory-backed
+    when the host has /dev/shm, or `configured` when it is set.
+    """
+    if configured:
+        return configured
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"meditreat-{INSTANCE_ID}", name)
@@ -9,11 +9,39 @@ DESCRIPTION:
 """
 
 from langchain_core.messages import AIMessage
-from typing import Dict
-from utils.config import setup_logger
+from typing import Dict, Optional, Tuple
+from utils.config import setup_logger, settings
+import json
 
 logger = setup_logger(__name__)
 
+# USD per million input and output tokens, by provider and model. Entries
+# in TOKEN_PRICES are merged over these; models not listed are priced at
+# INPUT_TOKEN_PRICE/OUTPUT_TOKEN_PRICE.
+PRICES: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "openai": {
+        "gpt-4o-mini": (0.15, 0.60),
+        "gpt-4o": (2.50, 10.00),
+    },
+    "anthropic": {
+        "claude-3": (3.00, 15.00),
+    },
+}
+
+def _load_prices() -> None:
+    """Merge the TOKEN_PRICES setting, {"provider": {"model": [input, output]}}, into PRICES."""
+    raw = settings.get("token_prices", "")
+    if not raw:
+        return
+    try:
+        for provider, models in json.loads(raw).items():
+            for model, (input_price, output_price) in models.items():
+                PRICES.setdefault(provider, {})[model] = (float(input_price), float(output_price))
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Ignoring invalid TOKEN_PRICES: {e}")
+
+_load_prices()
+
 def extract_ai_message(response_json: Dict) -> str:
     """
     Extract the AI's message content from the response JSON.
@@ -55,40 +83,46 @@ def extract_ai_message(response_json: Dict) -> str:
     logger.warning("No valid AI message content found in response.")
     return "I'm sorry, I couldn't generate a response. Please try again."
 
-def stream_extract_message(chunk) -> list[str]:
+def extract_usage(chunk) -> Dict[str, int]:
+    """
+    Extract token usage from a model message or streamed chunk with
+    `usage_metadata`. Returns an empty dict when it carries no usage.
+    """
+    metadata = getattr(chunk, "usage_metadata", None)
+    if not metadata:
+        return {}
+    return {
+        key: int(metadata.get(key, 0) or 0)
+        for key in ("input_tokens", "output_tokens", "total_tokens")
+    }
+
+def message_text(message) -> str:
+    """
+    Return the text content of a message or message chunk.
+    Providers such as Anthropic stream content as a list of blocks,
+    in which case the text blocks are concatenated.
+    """
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block if isinstance(block, str) else block.get("text", "")
+            for block in content
+            if isinstance(block, (str, dict))
+        )
+    return ""
+
+def token_cost(usage: Dict[str, int], provider: str = "openai", model: Optional[str] = None) -> float:
     """
-    Extract message strings from a streaming chunk (dict, object, or JSON string).
-    Returns a list of message strings.
+    Estimate the cost in USD of the given token usage of one provider's
+    model from its per-million-token prices.
     """
-    import json
-    messages = []
-    # If chunk is an object with .content
-    if hasattr(chunk, "content") and isinstance(chunk.content, str):
-        messages.append(chunk.content)
-    # If chunk is a dict
-    elif isinstance(chunk, dict):
-        # Try to extract 'content' directly
-        if "content" in chunk and isinstance(chunk["content"], str):
-            messages.append(chunk["content"])
-        # Or look for messages in nested dicts
-        elif "agent" in chunk and "messages" in chunk["agent"]:
-            for msg in chunk["agent"]["messages"]:
-                if hasattr(msg, "content") and isinstance(msg.content, str):
-                    messages.append(msg.content)
-                elif isinstance(msg, dict) and "content" in msg and isinstance(msg["content"], str):
-                    messages.append(msg["content"])
-    # If chunk is a JSON string
-    elif isinstance(chunk, str) and chunk.startswith("{"):
-        try:
-            data = json.loads(chunk)
-            if "content" in data and isinstance(data["content"], str):
-                messages.append(data["content"])
-            elif "agent" in data and "messages" in data["agent"]:
-                for msg in data["agent"]["messages"]:
-                    if isinstance(msg, dict) and "content" in msg and isinstance(msg["content"], str):
-                        messages.append(msg["content"])
-        except Exception:
-            messages.append(str(chunk))
-    else:
-        messages.append(str(chunk))
-    return messages
+    input_price, output_price = PRICES.get(provider, {}).get(model or "", (
+        settings.get("input_token_price", 0.0),
+        settings.get("output_token_price", 0.0),
+    ))
+    return (
+        usage.get("input_tokens", 0) * input_price
+        + usage.get("output_tokens", 0) * output_price
+    ) / 1_000_000
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines a lightweight in-process metrics registry
+    for counters and timings, exposed through the /metrics endpoint.
+"""
+
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List
+import threading
+import math
+
+
+def _key(name: str, labels: Dict[str, Any]) -> str:
+    """Build a flat metric key such as `chat.route{route=canned}`."""
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the nearest-rank percentile of the given values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _summarize(values: List[float], total: float) -> Dict[str, float]:
+    """Summarize a window of observations."""
+    return {
+        "count": len(values),
+        "total": total,
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+class MetricsRegistry:
+    """
+    Keeps counters and a bounded window of observations per metric so
+    the application can report traffic shares and latency percentiles
+    without an external metrics backend.
+    """
+    def __init__(self, window: int = 2048):
+        self._window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._observations: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self._window)
+        )
+        self._totals: Dict[str, float] = defaultdict(float)
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increment a counter."""
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record an observation, e.g. a latency in milliseconds."""
+        key = _key(name, labels)
+        with self._lock:
+            self._observations[key].append(value)
+            self._totals[key] += value
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Return the current value of a counter."""
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0.0)
+
+    def summary(self, name: str, **labels: Any) -> Dict[str, float]:
+        """Return count, total, mean and percentiles for an observed metric."""
+        key = _key(name, labels)
+        with self._lock:
+            values = list(self._observations.get(key, ()))
+            total = self._totals.get(key, 0.0)
+        return _summarize(values, total)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all counters and observation summaries."""
+        with self._lock:
+            counters = dict(self._counters)
+            observed = {
+                key: (list(values), self._totals[key])
+                for key, values in self._observations.items()
+            }
+        return {
+            "counters": counters,
+            "timings": {key: _summarize(*data) for key, data in observed.items()},
+        }
+
+    def reset(self) -> None:
+        """Clear all recorded metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+            self._totals.clear()
+
+
+metrics = MetricsRegistry()
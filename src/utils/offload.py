@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines the process pool CPU-heavy helpers are offloaded
+    to, so large decoding, ranking and serialization jobs do not stall the
+    event loop that streams answers. Small jobs run inline, since sending
+    them to another process costs more than the work itself.
+"""
+
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import ProcessPoolExecutor
+from utils.config import setup_logger, settings
+from typing import Any, Callable, Optional
+from utils.metrics import metrics
+import multiprocessing
+import asyncio
+import time
+import os
+
+logger = setup_logger("offload.log")
+
+
+def cpu_count() -> int:
+    """Cores this process may run on, honouring CPU affinity in containers."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def web_concurrency() -> int:
+    """Number of server workers: WEB_CONCURRENCY, or one per core when it is 0."""
+    return settings.get("web_concurrency", 0) or cpu_count()
+
+
+def _warm() -> int:
+    # Import the offloaded helpers' modules ahead of the first job
+    import memory.compression  # noqa: F401
+    import models.supabase  # noqa: F401
+    import utils.serialization  # noqa: F401
+    return os.getpid()
+
+
+class CPUPool:
+    """
+    Per-worker process pool. With several server workers, each gets an
+    equal share of the cores unless CPU_POOL_WORKERS is set. `start` spawns
+    the processes in the lifespan; a pool that was not started spawns them
+    on the first job of at least `min_items` items.
+    """
+    def __init__(self, processes: int, min_items: int):
+        self.processes = processes
+        self.min_items = min_items
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    async def start(self) -> None:
+        """Start the pool and spawn every process before traffic arrives."""
+        if self._executor is not None or self.processes <= 0:
+            return
+        self._create()
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(*(
+                loop.run_in_executor(self._executor, _warm) for _ in range(self.processes)
+            ))
+        except Exception as e:
+            # Jobs run inline rather than failing startup
+            logger.error(f"Failed to start CPU pool, running helpers inline: {e}")
+            self.processes = 0
+            await self.close()
+            return
+        logger.info(f"CPU pool started with {len(set(pids))} processes")
+
+    def _create(self) -> None:
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    async def run(self, fn: Callable[..., Any], *args: Any, size: int = 0) -> Any:
+        """
+        Run `fn(*args)` in the pool when the job has at least `min_items`
+        items, otherwise inline. `fn` and its arguments must be picklable.
+        """
+        if self.processes <= 0 or size < self.min_items:
+            return fn(*args)
+        if self._executor is None:
+            logger.info(f"Starting CPU pool with {self.processes} processes for a {size}-item job")
+            self._create()
+        start = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool as e:
+            logger.error(f"CPU pool broke, running helpers inline from now on: {e}")
+            self.processes = 0
+            await self.close()
+            return fn(*args)
+        metrics.observe("offload.job_ms", (time.perf_counter() - start) * 1000, fn=fn.__name__)
+        return result
+
+    async def close(self) -> None:
+        """Shut the pool down, waiting for running jobs."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown)
+
+
+cpu_pool = CPUPool(
+    processes=settings.get("cpu_pool_workers", 0) or max(1, cpu_count() // web_concurrency()),
+    min_items=settings.get("offload_min_items", 5000),
+)
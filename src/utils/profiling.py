@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines an on-demand sampling CPU profiler. While running
+    it periodically samples the stacks of all threads and aggregates them
+    into the collapsed ("folded") stack format understood by flamegraph.pl,
+    speedscope and similar tools, so hotspots can be captured from a live
+    process without restarting it.
+"""
+
+from collections import Counter
+from typing import Dict, Optional
+from types import FrameType
+import threading
+import time
+import sys
+import os
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another is running."""
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+    """Render a stack as `outer;...;inner`."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread at a fixed interval. Only one
+    profile runs at a time; sampling stops by itself after the duration.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, seconds: float) -> Dict[str, object]:
+        """
+        Sample for `seconds` (blocking the calling thread) and return the
+        folded stacks with sample counts.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            own_thread = threading.get_ident()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks: Counter = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    thread = names.get(thread_id, str(thread_id))
+                    stacks[f"{thread};{_collapse(frame)}"] += 1
+                samples += 1
+                time.sleep(self.interval)
+        finally:
+            self._lock.release()
+
+        return {
+            "seconds": seconds,
+            "interval": self.interval,
+            "samples": samples,
+            "folded": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+        }
+
+
+profiler = SamplingProfiler()
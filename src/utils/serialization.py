@@ -12,7 +12,7 @@ DESCRIPTION:
 from dataclasses import is_dataclass, asdict
 from datetime import datetime, date
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, Iterable
 from decimal import Decimal
 import numpy as np
 import json
@@ -72,6 +72,12 @@ def to_json(obj: Any) -> str:
     """
     return json.dumps(obj, cls=EnhancedJSONEncoder)
 
+def to_ndjson(rows: Iterable[Any]) -> str:
+    """
+    Serialize rows as newline-delimited JSON, one object per line.
+    """
+    return "".join(to_json(row) + "\n" for row in rows)
+
 def to_dict(obj: Any) -> Dict:
     """
     Convert any object to a dictionary that can be safely JSON serialized.
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+"""
+AUTHOR: Dan Njuguna
+DATE: 2026-10-19
+
+DESCRIPTION:
+    This module defines lightweight tracing spans for chat turns. Spans
+    are correlated by a per-turn trace ID carried in a context variable,
+    so work started from a turn (tasks, threads, LangChain callbacks) is
+    attributed to it. Finished spans are exported in batches to a local
+    JSONL file or to an OTLP/HTTP-compatible collector.
+"""
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from contextlib import contextmanager
+from utils.config import setup_logger, settings
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+from contextvars import ContextVar
+from uuid import UUID
+import threading
+import secrets
+import random
+import httpx
+import json
+import time
+import os
+
+logger = setup_logger("tracing.log")
+
+SERVICE_NAME = "meditreat"
+
+
+@dataclass
+class Span:
+    """A timed operation within a trace."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    sampled: bool = True
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1_000_000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class FileSpanExporter:
+    """Append spans as JSON lines to a local file."""
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class OTLPSpanExporter:
+    """Post spans to an OTLP/HTTP collector using the OTLP JSON encoding."""
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=timeout)
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        return {"key": key, "value": encoded}
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [self._attribute(k, v) for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            encoded["parentSpanId"] = span.parent_id
+        return encoded
+
+    def export(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [self._encode(span) for span in spans],
+                }],
+            }]
+        }
+        self._client.post(self.endpoint, json=payload).raise_for_status()
+
+
+class Tracer:
+    """
+    Creates spans and exports finished ones from a background thread,
+    so recording a span never blocks the event loop on I/O.
+    """
+    def __init__(
+        self,
+        exporter: Optional[Any] = None,
+        sample_rate: float = 1.0,
+        flush_interval: float = 2.0,
+        max_queue: int = 4096
+    ):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+        self._queue: List[Span] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def current_trace_id(self) -> Optional[str]:
+        span = self._current.get()
+        return span.trace_id if span else None
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """
+        Start a span without making it current. Without a parent the span
+        continues the current trace, or starts a new (possibly unsampled) one.
+        """
+        parent = parent or self._current.get()
+        if parent is None:
+            return Span(
+                name=name,
+                trace_id=secrets.token_hex(16),
+                span_id=secrets.token_hex(8),
+                attributes=attributes,
+                sampled=random.random() < self.sample_rate,
+            )
+        return Span(
+            name=name,
+            trace_id=parent.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id,
+            attributes=attributes,
+            sampled=parent.sampled,
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """End a span and queue it for export."""
+        if span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        if not self.enabled or not span.sampled:
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+        self._ensure_worker()
+
+    @contextmanager
+    def activate(self, span: Span) -> Iterator[Span]:
+        """Make a span current for the enclosed block without ending it."""
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span."""
+        span = self.start_span(name, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        finally:
+            self._current.reset(token)
+            self.end_span(span)
+
+    def flush(self) -> None:
+        """Export all queued spans now."""
+        with self._lock:
+            spans, self._queue = self._queue, []
+        if not spans or self.exporter is None:
+            return
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class TracingCallbackHandler(AsyncCallbackHandler):
+    """
+    LangChain callback handler recording model calls and tool runs (e.g.
+    the agent's web search) as child spans of a parent span.
+    """
+    def __init__(self, tracer: Tracer, parent: Span):
+        self.tracer = tracer
+        self.parent = parent
+        self._spans: Dict[UUID, Span] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, **attributes: Any) -> None:
+        parent = self._spans.get(parent_run_id) if parent_run_id else None
+        self._spans[run_id] = self.tracer.start_span(name, parent=parent or self.parent, **attributes)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.attributes.update(attributes)
+            self.tracer.end_span(span, error=error)
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs) -> None:
+        model = (kwargs.get("metadata") or {}).get("ls_model_name", "")
+        self._start(run_id, parent_run_id, "llm.call", model=model)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=error)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        name = (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, f"tool.{name}", input_chars=len(input_str or ""))
+
+    async def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error=error)
+
+
+def _build_exporter() -> Optional[Any]:
+    """Build the exporter selected by the TRACE_EXPORTER setting."""
+    kind = settings.get("trace_exporter", "none").lower()
+    if kind == "file":
+        return FileSpanExporter(settings.get("trace_file", "logs/traces.jsonl"))
+    if kind == "otlp":
+        return OTLPSpanExporter(settings.get("otlp_endpoint", "http://localhost:4318/v1/traces"))
+    return None
+
+
+tracer = Tracer(
+    exporter=_build_exporter(),
+    sample_rate=settings.get("trace_sample_rate", 1.0),
+)
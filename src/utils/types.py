@@ -14,3 +14,15 @@ from enum import Enum
 class Sender(Enum):
     USER = "user"
     SYSTEM = "assistant"
+
+class Route(Enum):
+    CANNED = "canned"
+    SMALL_TALK = "small_talk"
+    DIRECT = "direct"
+    AGENT = "agent"
+
+class JobStatus(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"